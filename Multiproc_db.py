@@ -1,43 +1,44 @@
 import csv
 import multiprocessing
+import os
 import pickle
 
+import numpy as np
 import Wordle_functions as wrdl
+import Wordle_db as wdb
 
-from multiprocessing import Pool
-from alive_progress import alive_bar
+from collections import ChainMap
+from multiprocessing import Pool, shared_memory
 
 
 def wordle_algorithm_4(solutions=None, allowed_words=None, \
                        entropy_db=None, \
-                       freq_map=None):
+                       freq_map=None, pattern_matrix=None, word_filter=None, model=None):
     reply = []
+    allowed_words = sorted(allowed_words)
+    if model is None:
+        model = wrdl.model_hash(freq_map, allowed_words, wrdl.ENTROPY_FLOATS)
+    if word_filter is None:
+        word_filter = wrdl.WordFilter(allowed_words)
 
     for s in solutions:
         hash_list = []
-        allowed_words = sorted(allowed_words)
         reduced_list = allowed_words
-        reduced_reply_map = wrdl.wordle_reply_generator()
 
         while True:
-            cur_hash = str(hash_list)
+            cur_hash = wrdl.state_hash(reduced_list, model)
+            legacy_hash = str(hash_list)
             if len(reduced_list) == 1:
                 guess = reduced_list[0]
             else:
-                if cur_hash in entropy_db:
-                    entropies_list = entropy_db[cur_hash]
-                else:
+                entropies_list = entropy_db.get(cur_hash)
+                if entropies_list is None:  # saved before entropy_db was keyed by state_hash
+                    entropies_list = entropy_db.get(legacy_hash)
+                if entropies_list is None:
                     # get all E[I] for reduced list
-                    entropies_list = []
-                    tmp = len(allowed_words)
-                    tmp2 = 1
                     print(f"-> Calculating entropies for {s}, {len(reduced_list)} possible solutions")
-                    for word in allowed_words:
-                        # print(f"omfg it working\t{tmp2}/{tmp}\t{(tmp2/tmp):.2%}")
-                        entropies_list.append(
-                            wrdl.expected_entropy_from_word(word, word_list=reduced_list, reply_map=reduced_reply_map,
-                                                            freq_map=freq_map))
-                        tmp2 += 1
+                    entropies_list = wrdl.expected_entropies(allowed_words, reduced_list, freq_map=freq_map,
+                                                             pattern_matrix=pattern_matrix).tolist()
 
                     entropy_db[cur_hash] = entropies_list
 
@@ -58,13 +59,13 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
                 else:
                     guess = cand2[0]
 
-            reply = wrdl.wordle_reply(s, guess)
+            reply = pattern_matrix.reply(s, guess) if pattern_matrix else wrdl.wordle_reply(s, guess)
             hash_list.append((guess, reply))
 
             if sum(reply) == 10:
                 break
 
-            reduced_list = wrdl.filter_words(guess, reply, allowed_words=reduced_list)
+            reduced_list = wrdl.filter_words(guess, reply, allowed_words=reduced_list, word_filter=word_filter)
             print(wrdl.wordle_print(reply), guess, f"{len(reduced_list)} words")
 
     return entropy_db
@@ -79,42 +80,103 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
 # print(f"Average number of tries:\t{sum(taken_tries)/len(taken_tries):.4}")
 # print(f"Number of losses:\t\t{len(invalid_guesses)} = {len(invalid_guesses)/len(taken_tries):.2%}")
 
-def f(iteration):
-    print(iteration)
-    entropy_db_freq = wrdl.load_entropy_db("entropy_db_freq")
-
+def load_words():
     # Importing solutions and allowed words to lists
     csv_reader = csv.reader(open('solutions.csv', 'r'))
     solutions = list(csv_reader)[0]  # contains all possible solutions
     csv_reader = csv.reader(open('allowed_words.csv', 'r'))
     allowed_words = list(csv_reader)[0]  # contains allowed words beside solutions
-    all_allowed = allowed_words + solutions
+    return solutions, sorted(allowed_words + solutions)
+
+
+# everything a worker needs, loaded once per worker process by init_worker
+worker = {}
+
+
+def init_worker(pattern_shm_name=None):
+    """
+    Pool initializer: loads word lists, freq map, pattern matrix and database once per worker process
 
+        Args:
+            pattern_shm_name (str): Name of the shared memory with the pattern matrix. If None,
+                                    the memory mapped pattern_matrix.bin is used
+    """
+    solutions, all_allowed = load_words()
     with open("all_allowed_freq_sigmoid.pkl", 'rb') as x:
         all_allowed_freq_sigmoid = pickle.load(x)
 
-    solutions = [solutions[iteration]]
+    if pattern_shm_name:
+        shm = shared_memory.SharedMemory(name=pattern_shm_name)
+        data = np.ndarray((len(all_allowed), len(all_allowed)), dtype=np.uint8, buffer=shm.buf)
+        worker["shm"] = shm
+        worker["pattern_matrix"] = wrdl.PatternMatrix(data, all_allowed, all_allowed)
+    else:
+        # memory mapped, all workers share one copy in the OS page cache
+        worker["pattern_matrix"] = wrdl.load_pattern_matrix()
 
-    entropy_db_freq = wordle_algorithm_4(solutions, allowed_words=all_allowed, entropy_db=entropy_db_freq,
-                                         freq_map=all_allowed_freq_sigmoid)
-    return entropy_db_freq
+    worker["solutions"] = solutions
+    worker["all_allowed"] = all_allowed
+    worker["freq_map"] = all_allowed_freq_sigmoid
+    worker["model"] = wrdl.model_hash(all_allowed_freq_sigmoid, all_allowed, wrdl.ENTROPY_FLOATS)
+    worker["word_filter"] = wrdl.WordFilter(all_allowed)
+    # read only, the main process writes. Keeps frequently used states (e.g. the first guess) in memory
+    worker["entropy_db"] = wdb.EntropyCache(wdb.EntropyDB(wdb.entropy_db_path("entropy_db_freq")), max_bytes=2 ** 28)
+
+
+def f(iteration):
+    print(iteration)
+    new_entries = {}
+
+    # lookups go to the database, new entries to new_entries. Only the new entries are sent back
+    wordle_algorithm_4([worker["solutions"][iteration]], allowed_words=worker["all_allowed"],
+                       entropy_db=ChainMap(new_entries, worker["entropy_db"]), freq_map=worker["freq_map"],
+                       pattern_matrix=worker["pattern_matrix"], word_filter=worker["word_filter"],
+                       model=worker["model"])
+    return iteration, new_entries
 
 
 if __name__ == '__main__':
+    from alive_progress import alive_bar  # not needed by the workers
+
     print("Hi")
-    entropy_db_freq = wrdl.load_entropy_db("entropy_db_freq")
+    entropy_db_freq = wdb.open_entropy_db("entropy_db_freq")
     old_len = len(entropy_db_freq)
     print(f"old len: {old_len}")
 
+    # finished solutions, survives a killed run. Delete it to start from scratch
+    delta_log = wdb.DeltaLog(wdb.delta_log_path("entropy_db_freq"))
+    print(f"Merged {delta_log.compact(entropy_db_freq)} entries of previous runs")
+
+    pattern_shm = None
+    if not os.path.exists(wrdl.PATTERN_MATRIX_FILE):
+        # calculated once and shared by all workers
+        print("Calculating pattern matrix")
+        solutions, all_allowed = load_words()
+        pattern_shm = shared_memory.SharedMemory(create=True, size=len(all_allowed) ** 2)
+        data = np.ndarray((len(all_allowed), len(all_allowed)), dtype=np.uint8, buffer=pattern_shm.buf)
+        for start in range(0, len(all_allowed), 1024):
+            data[start:start + 1024] = wrdl.wordle_reply_batch(all_allowed, all_allowed[start:start + 1024])
+        del data
+
     iterations = 2309
+    todo = [i for i in range(iterations) if i not in delta_log.done]
+    print(f"{iterations - len(todo)} solutions done in previous runs, {len(todo)} left")
     # start worker processes
-    with alive_bar(iterations) as bar:
-        with Pool(processes=multiprocessing.cpu_count()) as pool:
-            for i in pool.imap_unordered(f, range(iterations)):
-                entropy_db_freq.update(i)
-                bar()
-
-    # saving highscore
-    if len(entropy_db_freq) > old_len:
-        wrdl.save_entropy_db(entropy_db_freq, "entropy_db_freq")
-        print(f"Pickled hashes updated - new len: {len(entropy_db_freq)}")
+    try:
+        with alive_bar(len(todo)) as bar:
+            with Pool(processes=multiprocessing.cpu_count(), initializer=init_worker,
+                      initargs=(pattern_shm.name if pattern_shm else None,)) as pool:
+                for i, new_entries in pool.imap_unordered(f, todo):
+                    # stored right away so the other workers find them, e.g. second guesses of similar solutions
+                    entropy_db_freq.update(new_entries)
+                    # marked as done only after its entries are stored, a killed run repeats at most this one
+                    delta_log.append(i, {})
+                    bar()
+    finally:
+        if pattern_shm:
+            pattern_shm.close()
+            pattern_shm.unlink()
+        delta_log.close()
+
+    print(f"Hashes updated - new len: {len(entropy_db_freq)}")
+    entropy_db_freq.close()
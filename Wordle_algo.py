@@ -1,15 +1,13 @@
+import heapq
 import random
 import math
-import inquirer
 import os
 
 import numpy as np
 import Wordle_functions as wrdl
+import Wordle_trace as wtr
 
-from time import sleep
-from alive_progress import alive_it, config_handler
-from scipy.special import expit  # sigmoid function
-from IPython.display import clear_output
+from time import sleep, perf_counter
 
 """
 Proudly coded by hand
@@ -17,7 +15,20 @@ Github with annotated functions and jupyter notebook on
 https://github.com/loss-given-default/Wordle
 """
 
-config_handler.set_global(force_tty=True, bar="classic2", spinner="classic", title='Playing Wordle intensively')
+# inquirer, alive_progress, scipy and IPython are imported when they are used, so importing
+# the algorithms for headless runs (e.g. worker processes) stays fast
+
+def alive_it(items):
+    # progress bar over items
+    from alive_progress import alive_it, config_handler
+    config_handler.set_global(force_tty=True, bar="classic2", spinner="classic", title='Playing Wordle intensively')
+    return alive_it(items)
+
+
+def clear_output(wait=False):
+    # clears the output of a jupyter cell
+    from IPython.display import clear_output
+    clear_output(wait=wait)
 
 
 def clearConsole():
@@ -65,7 +76,7 @@ def wordle_algorithm_1(solutions=None, allowed_words=None, max_tries=12974, manu
 
             if verbose:
                 print(wrdl.wordle_print(reply), "", guess[i])
-            if sum(reply) == 10:
+            if sum(reply) == 2 * len(reply):
                 break
         taken_tries.append(i + 1)
         # clear_output(wait=True)
@@ -119,7 +130,7 @@ def wordle_algorithm_2(solutions=None, allowed_words=None, max_tries=12974, manu
 
             guess = random.choice(reduced_list)
 
-            if sum(reply) == 10:
+            if sum(reply) == 2 * len(reply):
                 break
         taken_tries.append(i + 1)
         # clear_output(wait=True)
@@ -141,6 +152,7 @@ def apply_sigmoid(data_dict, multiplier=10, summand=-0.5):
     values[1] += summand
     values[1] *= multiplier
     # sigmoid them
+    from scipy.special import expit  # sigmoid function
     values[1] = expit(values[1])
 
     # transform back to dict
@@ -149,10 +161,153 @@ def apply_sigmoid(data_dict, multiplier=10, summand=-0.5):
     return newD
 
 
+def entropies_for_state(allowed_words, reduced_list, freq_map, pattern_matrix=None, executor=None, tracer=None,
+                        weight_model=None):
+    """
+    Calculates E[I] and the probability to be the solution of every allowed word for the remaining
+    possible solutions. This is what entropy_db stores for a state
+
+        Args:
+            allowed_words (list):   List of strings with allowed words (possible guesses)
+            reduced_list (list):    Remaining possible solutions
+            freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            executor(Executor):     concurrent.futures executor to calculate entropies on multiple cores. Optional
+            tracer(Tracer):         Wordle_trace.Tracer to time the phases. Optional
+            weight_model(WeightModel): wrdl.WeightModel of freq_map over all allowed words, allowed_words can
+                                    be a subset of them. Optional, faster than standardizing freq_map
+
+        Returns:
+            entropies_list_all (list): List of tuples (E[I], probability, word), highest E[I] first
+    """
+    tracer = tracer or wtr.NULL_TRACER
+    with tracer.phase("expected_entropies", guesses=len(allowed_words), candidates=len(reduced_list)):
+        entropies_list = wrdl.expected_entropies(allowed_words, reduced_list, freq_map=freq_map,
+                                                 pattern_matrix=pattern_matrix, executor=executor).tolist()
+    with tracer.phase("standardize_freq_map"):
+        if weight_model is not None:
+            prob_db = weight_model.probabilities(reduced_list)
+            if len(allowed_words) != len(weight_model.vocabulary):  # e.g. legal guesses in hard mode
+                prob_db = prob_db[weight_model.vocabulary.indices(allowed_words)]
+            prob_db = prob_db.tolist()
+        else:
+            best_freq_map = wrdl.standardize_freq_map(freq_map, reduced_list)
+            prob_db = [best_freq_map[g] for g in allowed_words]
+
+    with tracer.phase("sort_entropies"):
+        entropies_list_all = list(zip(entropies_list, prob_db, allowed_words))
+        return sorted(entropies_list_all, reverse=True)
+
+
+def score_guesses(entropies_list_all, inf, turn, custom_score=(0, 0, 0), k=None):
+    """
+    Scores guesses by the expected number of guesses to solve (custom_score) and E[I]
+
+        Args:
+            entropies_list_all (list): List of tuples (E[I], probability, word), see entropies_for_state
+            inf (float):            Entropy of the remaining possible solutions in bits
+            turn (int):             Number of the guess, 1 for the first guess
+            custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
+            k (int):                Only return the k best guesses (partial selection instead of sorting
+                                    all of them). Optional, all guesses if None
+
+        Returns:
+            score_list (list):      List of tuples (-score, E[I], probability, word), best guess first
+    """
+    score_list = [None] * len(entropies_list_all)
+    a, b, c = custom_score  # parameters of polyfit regression (2 degrees)
+    for j in range(len(entropies_list_all)):
+        x, p, word = entropies_list_all[j]
+        x = inf - x  # Expected residual entropy of solution space after guessing word
+        if a == b == c == 0:
+            score = 0
+        else:
+            score = p * turn + (1 - p) * (turn + (a * pow(x, 2) + b * x + c))
+        score_list[j] = (round(-score, 10), round(inf - x, 10), p, word)
+    if k is not None:
+        return heapq.nlargest(k, score_list)
+    return sorted(score_list, reverse=True)
+
+
+def best_guesses(allowed_words, reduced_list, freq_map, inf, turn, custom_score=(0, 0, 0), k=5,
+                 pattern_matrix=None, executor=None, tracer=None, weight_model=None, batch_size=256, guesses=None):
+    """
+    The k best guesses, same result as score_guesses(entropies_for_state(...), inf, turn, custom_score, k),
+    but E[I] is only calculated for guesses that can still be among the k best. An upper bound of E[I]
+    (wrdl.entropy_upper_bounds, at most inf) gives the best score a guess could reach. Guesses are
+    evaluated in batches from the best possible score down until no remaining guess can beat the k-th
+    best score found
+
+        Args:
+            allowed_words (list):   List of strings with allowed words (possible guesses)
+            reduced_list (list):    Remaining possible solutions
+            freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
+            inf (float):            Entropy of the remaining possible solutions in bits
+            turn (int):             Number of the guess, 1 for the first guess
+            custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
+            k (int):                Number of guesses
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            executor(Executor):     concurrent.futures executor to calculate entropies on multiple cores. Optional
+            tracer(Tracer):         Wordle_trace.Tracer to time the phases. Optional
+            weight_model(WeightModel): wrdl.WeightModel of freq_map over allowed_words (same order). Optional
+            batch_size (int):       Number of guesses of the first batch, doubled for every further batch
+            guesses (list):         Guesses to choose from, a subset of allowed_words (list of words, mask or
+                                    index array), e.g. the legal guesses in hard mode. Optional, all if None
+
+        Returns:
+            score_list (list):      List of k tuples (-score, E[I], probability, word), best guess first
+    """
+    tracer = tracer or wtr.NULL_TRACER
+    if weight_model is None:
+        weight_model = wrdl.WeightModel(allowed_words, freq_map)
+    vocabulary = weight_model.vocabulary
+    candidates = vocabulary.indices(reduced_list)
+    pool = np.arange(len(vocabulary)) if guesses is None else vocabulary.indices(guesses)
+
+    with tracer.phase("entropy_upper_bounds", guesses=len(pool), candidates=len(candidates)):
+        # bound, p and best_score are aligned with pool
+        bound = np.minimum(wrdl.entropy_upper_bounds(pool, candidates, freq_map, vocabulary), inf)
+        bound += 1e-9  # floating point slack, a guess is only skipped if it is clearly worse
+        p = weight_model.probabilities(candidates)[pool]
+        a, b, c = custom_score
+        if a == b == c == 0:
+            best_score = np.zeros(len(pool))
+        else:
+            # lowest a*x^2 + b*x + c for the expected residual entropy x = inf - E[I] in [inf - bound, inf]
+            low = np.maximum(inf - bound, 0)
+            f = np.minimum(a * low ** 2 + b * low + c, a * inf ** 2 + b * inf + c)
+            if a > 0 and low.min() <= -b / (2 * a) <= inf:
+                vertex = -b / (2 * a)
+                f = np.where(low <= vertex, np.minimum(f, a * vertex ** 2 + b * vertex + c), f)
+            best_score = -(p * turn + (1 - p) * (turn + f)) + 1e-9
+        order = np.lexsort((bound, best_score))[::-1]  # best possible score first, then highest bound
+
+    score_list = []
+    start = 0
+    while start < len(order):
+        if len(score_list) == k:
+            g = order[start]
+            if (best_score[g], bound[g]) < score_list[-1][:2]:
+                break  # no remaining guess can be among the k best
+        batch = order[start:start + batch_size]
+        with tracer.phase("expected_entropies", guesses=len(batch), candidates=len(candidates)):
+            e = wrdl.expected_entropies(pool[batch], candidates, freq_map=freq_map, pattern_matrix=pattern_matrix,
+                                        executor=executor, vocabulary=vocabulary).tolist()
+        entropies_list = list(zip(e, p[batch].tolist(), (vocabulary.words[i] for i in pool[batch])))
+        score_list = heapq.nlargest(k, score_list + score_guesses(entropies_list, inf, turn, custom_score, k))
+        start += len(batch)
+        batch_size *= 2
+    tracer.count("entropy_evaluations", start)
+
+    return score_list
+
+
 ### Algorithm 3, 4 & 4.5
 def wordle_algorithm_4(solutions=None, allowed_words=None, \
                        max_tries=12974, manual=False, verbose=False, entropy_db=None, \
-                       freq_map=None, bar=False, custom_score=(0, 0, 0), jup=False):
+                       freq_map=None, bar=False, custom_score=(0, 0, 0), jup=False, pattern_matrix=None,
+                       executor=None, word_filter=None, model=None, tracer=None, prune=None, search=None,
+                       hard_mode=False):
     """
     Wordle algorithm mark 4: Makes use of the information from wordl reply by filtering out words
     that can't be the solution. Suggests guess with highest expected entropy from reduced solution
@@ -164,22 +319,77 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
             max_tries (int):        Max number of tries before giving up
             manual(bool):           If true, it asks for input for reply
             verbose(bool):          If true lots of stuff is printed
-            entropy_db(dict):       Dictionary of hashes with entropy list
+            entropy_db(dict):       Dictionary of hashes (see wrdl.state_hash) with entropy list,
+                                    Wordle_db.EntropyDB or Wordle_db.EntropyCache. Optional, if None nothing is saved
             freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
             custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
             jup(bool):              Clears screen for verbose mode in jup
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            executor(Executor):     concurrent.futures executor to calculate entropies on multiple cores. Optional
+            word_filter(WordFilter): WordFilter of allowed_words. Optional, built if None
+            model(bytes):           wrdl.model_hash of freq_map and allowed_words. Optional, calculated if None
+            tracer(Tracer):         Wordle_trace.Tracer, times every turn and phase and counts cache hits. Optional
+            prune(bool):            Only calculate E[I] of guesses that can be the best one (see best_guesses).
+                                    These states are not complete, so they are kept for this run only and
+                                    not stored in entropy_db. Default: prune if entropy_db is None.
+                                    Ignored if manual
+            search(LookaheadSearch): Wordle_search.LookaheadSearch over the same words and freq_map. Optional,
+                                    if given guesses are chosen by lookahead search instead. Ignored if manual
+                                    or hard_mode
+            hard_mode(bool):        Every guess has to use the hints received so far (see WordFilter.hard_mode_mask).
+                                    The legal guesses are filtered with every reply and only they are scored.
+                                    Their scores are kept for this run only and not stored in entropy_db
             
         Returns:
             taken_tries (list):     list of int how many tries it took to solve for each solution
     """
-
     taken_tries = {}
+    for game in wordle_algorithm_4_iter(solutions=solutions, allowed_words=allowed_words, max_tries=max_tries,
+                                        manual=manual, verbose=verbose, entropy_db=entropy_db, freq_map=freq_map,
+                                        bar=bar, custom_score=custom_score, jup=jup, pattern_matrix=pattern_matrix,
+                                        executor=executor, word_filter=word_filter, model=model, tracer=tracer,
+                                        prune=prune, search=search, hard_mode=hard_mode):
+        taken_tries[game["solution"]] = game["history"]
+
+    return taken_tries
+
+
+def wordle_algorithm_4_iter(solutions=None, allowed_words=None, \
+                            max_tries=12974, manual=False, verbose=False, entropy_db=None, \
+                            freq_map=None, bar=False, custom_score=(0, 0, 0), jup=False, pattern_matrix=None,
+                            executor=None, word_filter=None, model=None, tracer=None, prune=None,
+                            search=None, hard_mode=False):
+    """
+    Wordle algorithm mark 4 as a generator: yields the result of every game as soon as it is solved,
+    nothing is kept after that. Takes the same arguments as wordle_algorithm_4.
+    entropy_db is saved when all solutions are solved; new entries stay in entropy_db if the
+    generator is stopped early. Results can be written with wrdl.save_games_jsonl
+
+        Yields:
+            game (dict):            solution, solved, tries, guesses, replies, entropy (bits left before
+                                    every guess), expected_entropy (E[I] of every guess), candidates
+                                    (possible solutions before every guess), turn_seconds, seconds and
+                                    history (as in wordle_algorithm_4)
+    """
+
     reply = []
-    score_list = [None] * len(allowed_words)
+    save_db = isinstance(entropy_db, dict)
+    if prune is None:
+        prune = entropy_db is None
+    prune = prune and not manual
+    best_db = {}  # (state hash, turn) -> best guesses of pruned states, (state hash, turn, legal hash) in hard mode
+    if entropy_db is None:
+        entropy_db = {}
     len_db = len(entropy_db)
     allowed_words = sorted(allowed_words)
-    reduced_reply_map_save = wrdl.wordle_reply_generator()
-    inf_start = wrdl.entropy_from_distribution(freq_map, allowed_words)
+    if word_filter is None:
+        word_filter = wrdl.WordFilter(allowed_words)
+    # distribution and entropy of the possible solutions, updated after every reply
+    weight_model = wrdl.WeightModel(word_filter.vocabulary, freq_map)
+    weights_start = weight_model.state()
+    if model is None:
+        model = wrdl.model_hash(freq_map, allowed_words)
+    tracer = tracer or wtr.NULL_TRACER
 
     if bar:
         bar = alive_it(solutions)
@@ -189,11 +399,14 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
     for s in bar:
 
         history = []
+        game = {"solution": s, "guesses": [], "replies": [], "entropy": [], "expected_entropy": [],
+                "candidates": [], "turn_seconds": []}
         print_queue = []
         hash_list = [sum(list(freq_map.values()))]
         reduced_list = allowed_words
-        reduced_reply_map = reduced_reply_map_save
-        inf = inf_start
+        weights = weights_start
+        legal = np.arange(len(word_filter.vocabulary)) if hard_mode else None  # legal guesses as index array
+        inf = weights.entropy
 
         try:
             bar.title = f"-> Currently solving {s}"
@@ -209,55 +422,78 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
                 print_queue.append(f"{s}\tI:{inf:.4}\t{(solutions.index(s) + 1) / len(solutions):.2%}")
             for string in print_queue: print(string)
         for i in range(max_tries):
+            turn_time = perf_counter()
+            turn_start = tracer.start()
+            turn_candidates = len(reduced_list)
             history.append((i + 1, inf))
-            cur_hash = wrdl.get_hash(str(hash_list))
+            with tracer.phase("state_hash"):
+                cur_hash = wrdl.state_hash(reduced_list, model)
+                legacy_hash = wrdl.get_hash(str(hash_list))
             if len(reduced_list) == 1:
                 guess = reduced_list[0]
                 EI = 0
+            elif search is not None and not manual and not hard_mode:
+                with tracer.phase("search", candidates=len(reduced_list)):
+                    guess, _ = search.best_guess(reduced_list)
+                with tracer.phase("entropy"):
+                    EI = float(wrdl.expected_entropies([guess], reduced_list, freq_map=freq_map,
+                                                       pattern_matrix=pattern_matrix)[0])
             else:
-                if cur_hash in entropy_db:
-                    entropies_list_all = entropy_db[cur_hash]
-                else:
-                    # get all E[I] for reduced list
-                    entropies_list = []
-                    tmp = len(allowed_words)
-                    tmp2 = 1
-                    # bar = alive_it(allowed_words)
-                    for word in allowed_words:
-                        try:
-                            bar.title = f"-> Calculating entropies {s} {tmp2}/{tmp}"
-                        except:
-                            print(f"-> Calculating entropies {s} {tmp2}/{tmp}")
-                            pass
-                        entropies_list.append(
-                            wrdl.expected_entropy_from_word(word, word_list=reduced_list, reply_map=reduced_reply_map,
-                                                            freq_map=freq_map))
-                        tmp2 += 1
-
-                    # Select best guess
-                    best_freq_map = wrdl.standardize_freq_map(freq_map, reduced_list)
-                    prob_db = [best_freq_map[g] for g in allowed_words]
-
-                    entropies_list_all = list(zip(entropies_list, prob_db, allowed_words))
-                    entropies_list_all = sorted(entropies_list_all, reverse=True)
-
-                    entropy_db[cur_hash] = entropies_list_all  # TODO Check if it works
-
-                for j in range(len(entropies_list_all)):
-                    x, p, word = entropies_list_all[j]
-                    x = inf - x  # Expected residual entropy of solution space after guessing word
-                    a, b, c = custom_score  # parameters of polyfit regression (2 degrees)
-                    if a == b == c == 0:
-                        score = 0
+                score_list = None
+                with tracer.phase("lookup"):
+                    entropies_list_all = entropy_db.get(cur_hash)
+                    if entropies_list_all is None:  # saved before entropy_db was keyed by state_hash
+                        entropies_list_all = entropy_db.get(legacy_hash)
+                    if hard_mode:
+                        best_key = (cur_hash, i + 1, legal.tobytes())
+                        if entropies_list_all is not None:  # complete list, keep the legal guesses
+                            legal_mask = word_filter.vocabulary.mask(legal)
+                            index = word_filter.vocabulary.index
+                            entropies_list_all = [x for x in entropies_list_all if legal_mask[index[x[-1]]]]
                     else:
-                        score = p * (i + 1) + (1 - p) * ((i + 1) + (a * pow(x, 2) + b * x + c))
-                    score_list[j] = (round(-score, 10), round(inf - x, 10), p, word)
-                score_list = sorted(score_list, reverse=True)
+                        best_key = (cur_hash, i + 1)
+                    if entropies_list_all is None and (prune or hard_mode):
+                        score_list = best_db.get(best_key)
+                tracer.count("cache_misses" if entropies_list_all is None and score_list is None else "cache_hits")
+                if entropies_list_all is None and prune:
+                    if score_list is None:
+                        score_list = best_guesses(allowed_words, reduced_list, freq_map, inf, i + 1, custom_score, k=1,
+                                                  pattern_matrix=pattern_matrix, executor=executor, tracer=tracer,
+                                                  weight_model=weight_model, guesses=legal)
+                        best_db[best_key] = score_list
+                elif entropies_list_all is None and hard_mode:
+                    if score_list is None:  # only the legal guesses, so it isn't stored in entropy_db
+                        legal_words = word_filter.vocabulary.subset(legal)
+                        entropies_list_all = entropies_for_state(legal_words, reduced_list, freq_map,
+                                                                 pattern_matrix=pattern_matrix, executor=executor,
+                                                                 tracer=tracer, weight_model=weight_model)
+                        tracer.count("entropy_evaluations", len(legal_words))
+                        score_list = score_guesses(entropies_list_all, inf, i + 1, custom_score)
+                        best_db[best_key] = score_list
+                elif entropies_list_all is None:
+                    # get all E[I] for reduced list
+                    try:
+                        bar.title = f"-> Calculating entropies {s}"
+                    except:
+                        pass
+                    entropies_list_all = entropies_for_state(allowed_words, reduced_list, freq_map,
+                                                             pattern_matrix=pattern_matrix, executor=executor,
+                                                             tracer=tracer, weight_model=weight_model)
+                    tracer.count("entropy_evaluations", len(allowed_words))
+                    with tracer.phase("store"):
+                        entropy_db[cur_hash] = entropies_list_all  # TODO Check if it works
+
+                # Select best guess
+                if entropies_list_all is not None and score_list is None:
+                    with tracer.phase("score_guesses"):
+                        score_list = score_guesses(entropies_list_all, inf, i + 1, custom_score,
+                                                   k=None if manual else 1)
 
                 guess = score_list[0][-1]
                 EI = score_list[0][1]
 
             if manual and EI != 0:
+                import inquirer
                 print_later = ["", "", ""]
                 i = 0
                 for word in score_list:
@@ -269,12 +505,11 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
                 possible_guesses = [
                     inquirer.List('guess',
                                   message="Choose your guess!",
+                                  # in hard mode there can be fewer than 5 legal guesses
                                   choices=[
-                                      f"{score_list[0][-1]} E[I]:{score_list[0][-3]:.2f} bits P: {score_list[0][-2]:.2%} S: {score_list[0][0]:.2f}",
-                                      f"{score_list[1][-1]} E[I]:{score_list[1][-3]:.2f} bits P: {score_list[1][-2]:.2%} S: {score_list[1][0]:.2f}",
-                                      f"{score_list[2][-1]} E[I]:{score_list[2][-3]:.2f} bits P: {score_list[2][-2]:.2%} S: {score_list[2][0]:.2f}",
-                                      f"{score_list[3][-1]} E[I]:{score_list[3][-3]:.2f} bits P: {score_list[3][-2]:.2%} S: {score_list[3][0]:.2f}",
-                                      f"{score_list[4][-1]} E[I]:{score_list[4][-3]:.2f} bits P: {score_list[4][-2]:.2%} S: {score_list[4][0]:.2f}",
+                                      f"{word[-1]} E[I]:{word[-3]:.2f} bits P: {word[-2]:.2%} S: {word[0]:.2f}"
+                                      for word in score_list[:5]
+                                  ] + [
                                       "--------------------",
                                       print_later[0],
                                       print_later[1],
@@ -283,7 +518,8 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
                                   )
                 ]
 
-                guess = inquirer.prompt(possible_guesses)["guess"][:5]
+                # empty entries (fewer than 3 possible solutions) and the separator ask for input below
+                guess = (inquirer.prompt(possible_guesses)["guess"].split() or [""])[0]
                 try:
                     EI = [x[1] for x in score_list if x[3] == guess][0]
                 except:
@@ -291,43 +527,205 @@ def wordle_algorithm_4(solutions=None, allowed_words=None, \
                     EI = [x[1] for x in score_list if x[3] == guess][0]
 
                 if EI == 0:  # -> solution is known by algorithm
-                    reply = [2, 2, 2, 2, 2]
-                elif len(s) == 5:  # -> solution was provided
-                    reply = wrdl.wordle_reply(s, guess)
+                    reply = [2] * len(guess)
+                elif s in word_filter.vocabulary:  # -> solution was provided
+                    reply = pattern_matrix.reply(s, guess) if pattern_matrix else wrdl.wordle_reply(s, guess)
                 else:  # -> solution was not provided
                     reply = [int(item) for item in input("Wordl reply e.g. 0 2 1 0 0\n").split()]
             elif EI == 0:
-                reply = [2, 2, 2, 2, 2]
+                reply = [2] * len(guess)
             else:
-                reply = wrdl.wordle_reply(s, guess)
+                with tracer.phase("reply"):
+                    reply = pattern_matrix.reply(s, guess) if pattern_matrix else wrdl.wordle_reply(s, guess)
 
-            if sum(reply) == 10:
-                if manual or verbose:
-                    clearConsole()
-                    if jup: clear_output(wait=True)
-                    print_queue.append(f"{wrdl.wordle_print(reply)} {guess} E[I]:{EI:.2f} bits I:{inf:.2f} bits ✔️")
-                    for string in print_queue: print(string)
+            game["guesses"].append(guess)
+            game["replies"].append(list(reply))
+            game["entropy"].append(float(inf))
+            game["expected_entropy"].append(float(EI))
+            game["candidates"].append(turn_candidates)
 
+            if sum(reply) == 2 * len(reply):
+                if manual or verbose:
+                    with tracer.phase("output"):
+                        clearConsole()
+                        if jup: clear_output(wait=True)
+                        print_queue.append(f"{wrdl.wordle_print(reply)} {guess} E[I]:{EI:.2f} bits I:{inf:.2f} bits ✔️")
+                        for string in print_queue: print(string)
+
+                tracer.record("turn", turn_start, solution=s, turn=len(history), candidates=turn_candidates)
+                game["turn_seconds"].append(perf_counter() - turn_time)
                 break
 
             hash_list.append((guess, reply))
             inf_before = inf
-            reduced_list = wrdl.filter_words(guess, reply, allowed_words=reduced_list)
-            inf = float(wrdl.entropy_from_distribution(freq_map, reduced_list))
+            with tracer.phase("filter_words"):
+                reduced_list = wrdl.filter_words(guess, reply, allowed_words=reduced_list, word_filter=word_filter)
+            with tracer.phase("entropy"):
+                weights = weights.filter(reduced_list)
+                inf = weights.entropy
             rec_inf = inf_before - inf
+            if hard_mode:
+                with tracer.phase("legal_guesses", guesses=len(legal)):
+                    legal = word_filter.filter_hard_mode(guess, reply, legal)
 
             if manual or verbose:
-                clearConsole()
-                if jup: clear_output(wait=True)
-                print_queue.append(
-                    f"{wrdl.wordle_print(reply)} {guess} E[I]:{EI:.2f} bits I:{rec_inf:.2f} bits {len(reduced_list)} words {inf:.3} bits left")
-                for string in print_queue: print(string)
-                if 1 < len(reduced_list) < 16: print(reduced_list)
+                with tracer.phase("output"):
+                    clearConsole()
+                    if jup: clear_output(wait=True)
+                    print_queue.append(
+                        f"{wrdl.wordle_print(reply)} {guess} E[I]:{EI:.2f} bits I:{rec_inf:.2f} bits {len(reduced_list)} words {inf:.3} bits left")
+                    for string in print_queue: print(string)
+                    if 1 < len(reduced_list) < 16: print(reduced_list)
+            tracer.record("turn", turn_start, solution=s, turn=len(history), candidates=turn_candidates)
+            game["turn_seconds"].append(perf_counter() - turn_time)
+
+        tracer.count("games")
+        game.update(solved=sum(reply) == 2 * len(reply), tries=len(history), seconds=sum(game["turn_seconds"]), history=history)
+        yield game
+
+    with tracer.phase("save_db"):
+        if save_db and len(entropy_db) > len_db:
+            wrdl.save_entropy_db(entropy_db, "entropy_db")
+            print(f"Pickled hashes updated - new len: {len(entropy_db)}")
+        elif hasattr(entropy_db, "flush"):
+            entropy_db.flush()
+
+
+### Multi-board (Quordle, Octordle)
+def wordle_algorithm_multi(solutions=None, allowed_words=None, max_tries=12974, verbose=False, freq_map=None,
+                           bar=False, pattern_matrix=None, word_filter=None, tracer=None):
+    """
+    Multi-board Wordle: every guess is played on several boards at once (4 in Quordle, 8 in Octordle),
+    each with its own hidden word. Keeps the possible solutions of every board and suggests the guess
+    with the highest joint expected entropy over the boards that are not solved yet. A board with only
+    one possible solution left is guessed right away. Takes word frequency into account.
 
-        taken_tries[s] = history
+        Args:
+            solutions (list):       List of tuples of hidden words, one word per board, to iterate over
+            allowed_words (list):   List of strings with allowed words
+            max_tries (int):        Max number of tries before giving up
+            verbose(bool):          If true every guess and its replies are printed
+            freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            word_filter(WordFilter): WordFilter of allowed_words. Optional, built if None
+            tracer(Tracer):         Wordle_trace.Tracer, times every turn and phase. Optional
 
-    if len(entropy_db) > len_db:
-        wrdl.save_entropy_db(entropy_db, "entropy_db")
-        print(f"Pickled hashes updated - new len: {len(entropy_db)}")
+        Returns:
+            taken_tries (dict):     tuple of hidden words -> list of the turn each board was solved in (None if not)
+    """
+    taken_tries = {}
+    for game in wordle_algorithm_multi_iter(solutions=solutions, allowed_words=allowed_words, max_tries=max_tries,
+                                            verbose=verbose, freq_map=freq_map, bar=bar,
+                                            pattern_matrix=pattern_matrix, word_filter=word_filter, tracer=tracer):
+        taken_tries[tuple(game["solutions"])] = game["solved_turn"]
 
     return taken_tries
+
+
+def wordle_algorithm_multi_iter(solutions=None, allowed_words=None, max_tries=12974, verbose=False, freq_map=None,
+                                bar=False, pattern_matrix=None, word_filter=None, tracer=None):
+    """
+    Multi-board algorithm as a generator: yields the result of every game as soon as it is solved.
+    Takes the same arguments as wordle_algorithm_multi. E[I] of all guesses on all unsolved boards is
+    calculated in one pass (wrdl.expected_entropies_boards), so a turn costs about as much as one board
+    with all their possible solutions. Best guesses are kept for this run by the candidates of the
+    unsolved boards, e.g. the first guess is calculated once
+
+        Yields:
+            game (dict):            solutions, solved, tries, guesses, replies (one per board, None for boards
+                                    that were solved before), entropy (bits left over all unsolved boards
+                                    before every guess), expected_entropy (joint E[I] of every guess),
+                                    candidates (possible solutions per board before every guess, 0 if solved),
+                                    solved_turn (turn each board was solved in, None if not), turn_seconds and seconds
+    """
+    allowed_words = sorted(allowed_words)
+    if word_filter is None:
+        word_filter = wrdl.WordFilter(allowed_words)
+    vocabulary = word_filter.vocabulary
+    weight_model = wrdl.WeightModel(vocabulary, freq_map)
+    guesses = np.arange(len(vocabulary))
+    tracer = tracer or wtr.NULL_TRACER
+    best_db = {}  # candidates of the unsolved boards -> (best guess, joint E[I])
+
+    if bar:
+        bar = alive_it(solutions)
+    else:
+        bar = solutions
+
+    for hidden in bar:
+        hidden = list(hidden)
+        game = {"solutions": hidden, "guesses": [], "replies": [], "entropy": [], "expected_entropy": [],
+                "candidates": [], "solved_turn": [None] * len(hidden), "turn_seconds": []}
+        states = [weight_model.state() for _ in hidden]  # possible solutions of every board
+
+        try:
+            bar.title = f"-> Currently solving {' '.join(hidden)}"
+        except:
+            pass
+
+        for i in range(max_tries):
+            turn_time = perf_counter()
+            turn_start = tracer.start()
+            unsolved = [b for b in range(len(hidden)) if game["solved_turn"][b] is None]
+            candidates = [states[b].indices for b in unsolved]
+            single = [c for c in candidates if len(c) == 1]
+
+            if single:  # solves a board for sure
+                guess = int(single[0][0])
+                with tracer.phase("expected_entropies", guesses=1, candidates=sum(len(c) for c in candidates)):
+                    EI = float(wrdl.expected_entropies_boards(np.array([guess]), candidates, freq_map,
+                                                              pattern_matrix, vocabulary=vocabulary).sum())
+            else:
+                with tracer.phase("lookup"):
+                    key = tuple(sorted(c.tobytes() for c in candidates))  # the order of the boards doesn't matter
+                    best = best_db.get(key)
+                tracer.count("cache_misses" if best is None else "cache_hits")
+                if best is None:
+                    with tracer.phase("expected_entropies", guesses=len(guesses),
+                                      candidates=sum(len(c) for c in candidates)):
+                        e = wrdl.expected_entropies_boards(guesses, candidates, freq_map, pattern_matrix,
+                                                           vocabulary=vocabulary).sum(axis=1)
+                    tracer.count("entropy_evaluations", len(guesses))
+                    with tracer.phase("score_guesses"):
+                        # highest joint E[I], if equal the guess most likely to be a hidden word
+                        p = sum(states[b].probabilities() for b in unsolved)
+                        g = np.lexsort((p, np.round(e, 10)))[-1]
+                        best = best_db[key] = (int(g), float(e[g]))
+                guess, EI = best
+
+            word = vocabulary.words[guess]
+            with tracer.phase("reply"):
+                replies = [None] * len(hidden)
+                for b in unsolved:
+                    replies[b] = pattern_matrix.reply(hidden[b], word) if pattern_matrix else \
+                        wrdl.wordle_reply(hidden[b], word)
+
+            game["guesses"].append(word)
+            game["replies"].append(replies)
+            game["entropy"].append(sum(states[b].entropy for b in unsolved))
+            game["expected_entropy"].append(EI)
+            game["candidates"].append([len(states[b]) if b in unsolved else 0 for b in range(len(hidden))])
+
+            with tracer.phase("filter_words"):
+                for b in unsolved:
+                    if sum(replies[b]) == 2 * len(replies[b]):
+                        game["solved_turn"][b] = i + 1
+                    else:
+                        states[b] = states[b].filter(word_filter.filter(word, replies[b], states[b].indices))
+
+            if verbose:
+                with tracer.phase("output"):
+                    left = " ".join(str(len(states[b])) if game["solved_turn"][b] is None else "-"
+                                    for b in range(len(hidden)))
+                    print(f"{word} {' '.join(wrdl.wordle_print(r) if r else '✔️' for r in replies)} "
+                          f"E[I]:{EI:.2f} bits words left: {left}")
+            tracer.record("turn", turn_start, solution=" ".join(hidden), turn=i + 1,
+                          candidates=sum(len(c) for c in candidates))
+            game["turn_seconds"].append(perf_counter() - turn_time)
+            if all(x is not None for x in game["solved_turn"]):
+                break
+
+        tracer.count("games")
+        game.update(solved=all(x is not None for x in game["solved_turn"]), tries=len(game["guesses"]),
+                    seconds=sum(game["turn_seconds"]))
+        yield game
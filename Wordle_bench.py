@@ -0,0 +1,308 @@
+import argparse
+import csv
+import json
+import os
+import pickle
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+import Wordle_functions as wrdl
+import Wordle_algo as algo
+import Wordle_db as wdb
+import Wordle_trace as wtr
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+BENCH_VERSION = 3  # 2: peak_rss_mb only in meta, 3: repeated runs, ops_per_sec of the fastest
+MIN_P99_SAMPLES = 100  # p99 of fewer latencies is just the slowest call
+MIN_P99_CHANGE_MS = 0.05  # smaller changes of p99 are timer resolution
+CUSTOM_SCORE = (-0.012405539570697632, 0.3642899622411526, 1.1890485932345454)
+
+
+def load_words():
+    # Importing solutions and allowed words to lists
+    csv_reader = csv.reader(open('solutions.csv', 'r'))
+    solutions = list(csv_reader)[0]  # contains all possible solutions
+    csv_reader = csv.reader(open('allowed_words.csv', 'r'))
+    allowed_words = list(csv_reader)[0]  # contains allowed words beside solutions
+    return solutions, sorted(allowed_words + solutions)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, None if it can't be measured"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10  # bytes on macOS, KB on Linux
+
+
+def summarize(runs, ops=None, **extra):
+    """
+    Summary of a benchmark that was run one or more times. ops_per_sec is the one of the fastest run, other
+    processes only make runs slower. Percentiles are over all calls
+
+        Args:
+            runs (list):        Seconds per operation of every run
+            ops (int):          Number of operations per run, len of the run if None
+            extra:              Additional fields for the result
+
+        Returns:
+            result (dict):      n (operations of all runs), samples (timed calls), repeats, seconds,
+                                ops_per_sec, p50_ms, p99_ms and extra
+    """
+    runs = [np.asarray(latencies, dtype=float) for latencies in runs]
+    ops_per_run = [len(latencies) if ops is None else ops for latencies in runs]
+    rates = [n / latencies.sum() for n, latencies in zip(ops_per_run, runs) if latencies.sum()]
+    latencies = np.concatenate(runs)
+    result = {"n": sum(ops_per_run),
+              "samples": len(latencies),
+              "repeats": len(runs),
+              "seconds": float(latencies.sum()),
+              "ops_per_sec": float(max(rates)) if rates else None,
+              "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+              "p99_ms": float(np.percentile(latencies, 99)) * 1000}
+    result.update(extra)
+    return result
+
+
+def time_calls(func, calls, repeats=1):
+    """Calls func(*args) for every args in calls, repeats times, and returns the seconds of every call per run"""
+    calls = list(calls)
+    runs = []
+    for _ in range(repeats):
+        latencies = []
+        for args in calls:
+            start = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - start)
+        runs.append(latencies)
+    return runs
+
+
+def bench_functions(words, solutions, freq_map, seed=0, n=200, n_candidates=500, repeats=3):
+    """
+    Benchmarks the functions used for every move on random (seeded) guesses and candidate lists
+
+        Args:
+            words (list):           Allowed words
+            solutions (list):       Possible solutions
+            freq_map (dict):        Dictionary of words (key) and frequency (value)
+            seed (int):             Seed of the random guesses
+            n (int):                Number of calls per function
+            n_candidates (int):     Number of remaining possible solutions
+            repeats (int):          Number of runs of every benchmark
+
+        Returns:
+            results (dict):         Name of the function and its summary
+    """
+    rng = random.Random(seed)
+    guesses = rng.choices(words, k=n)
+    answers = rng.choices(solutions, k=n)
+    replies = [wrdl.wordle_reply(s, g) for s, g in zip(answers, guesses)]
+    candidates = sorted(rng.sample(words, min(n_candidates, len(words))))
+    candidate_freq_map = wrdl.standardize_freq_map(freq_map, candidates)
+    word_filter = wrdl.WordFilter(words)
+    reply_map = wrdl.wordle_reply_generator()
+    results = {}
+
+    results["wordle_reply"] = summarize(time_calls(wrdl.wordle_reply, zip(answers, guesses), repeats))
+    results["filter_words"] = summarize(time_calls(
+        lambda g, r: wrdl.filter_words(g, r, allowed_words=words), zip(guesses, replies), repeats))
+    results["filter_words_word_filter"] = summarize(time_calls(
+        lambda g, r: wrdl.filter_words(g, r, allowed_words=words, word_filter=word_filter), zip(guesses, replies),
+        repeats))
+    results["guess_probability_map"] = summarize(time_calls(
+        lambda g: wrdl.guess_probability_map(g, candidates, candidate_freq_map, reply_map), ((g,) for g in guesses),
+        repeats))
+    results["guess_probability_map_bucket"] = summarize(time_calls(
+        lambda g: wrdl.guess_probability_map(g, candidates, candidate_freq_map, reply_map, bucket=True),
+        ((g,) for g in guesses), repeats))
+    results["expected_entropy_from_word"] = summarize(time_calls(
+        lambda g: wrdl.expected_entropy_from_word(g, candidates, reply_map, freq_map, bucket=True),
+        ((g,) for g in guesses), repeats))
+    # one call per candidate list, ops are guesses
+    calls = [()] * 3
+    results["expected_entropies"] = summarize(
+        time_calls(lambda: wrdl.expected_entropies(words, candidates, freq_map), calls, repeats),
+        ops=len(words) * len(calls))
+    return results
+
+
+def bench_load_entropy_db(filename="entropy_db"):
+    """Benchmarks load_entropy_db, None if no chunk of filename exists"""
+    if not any(os.path.exists(os.path.join(wdb.ENTROPY_DB_DIR, f"{filename}_{i}.pkl")) for i in range(30)):
+        return None
+    start = time.perf_counter()
+    entropy_db = wrdl.load_entropy_db(filename)
+    return summarize([[time.perf_counter() - start]], entries=len(entropy_db))
+
+
+def bench_algorithm(words, solutions, freq_map, custom_score=CUSTOM_SCORE, pattern_matrix=None, repeats=1):
+    """
+    Runs wordle_algorithm_4 over all solutions twice: cold (empty cache) and warm (cache of the first run).
+    Every repeat starts with an empty cache
+
+        Args:
+            words (list):           Allowed words
+            solutions (list):       Solutions to solve
+            freq_map (dict):        Dictionary of words (key) and frequency (value)
+            custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
+            pattern_matrix(PatternMatrix): Precomputed replies. Optional
+            repeats (int):          Number of cold and warm runs
+
+        Returns:
+            results (dict):         Summary of the cold and the warm runs, with median time per phase
+    """
+    tracers = {"cold": [], "warm": []}
+    tries = {}
+
+    for _ in range(repeats):
+        entropy_db = wdb.EntropyCache(max_bytes=None)  # in memory only, nothing is saved
+        for run in ["cold", "warm"]:
+            tracer = wtr.Tracer()
+            history = algo.wordle_algorithm_4(solutions=solutions, allowed_words=words, entropy_db=entropy_db,
+                                              freq_map=freq_map, custom_score=custom_score,
+                                              pattern_matrix=pattern_matrix, tracer=tracer)
+            tries[run] = [len(x) for x in history.values()]  # the same in every repeat
+            tracers[run].append(tracer)
+
+    results = {}
+    for run, run_tracers in tracers.items():
+        summaries = [tracer.summary() for tracer in run_tracers]
+        results[f"algorithm_4_{run}"] = summarize([tracer.durations("turn") for tracer in run_tracers],
+                                                  games=len(solutions),
+                                                  avg_tries=sum(tries[run]) / len(tries[run]),
+                                                  losses=len([x for x in tries[run] if x > 6]),
+                                                  counters=summaries[0]["counters"],
+                                                  phases_ms={k: float(np.median([s["phases"][k]["total_ms"]
+                                                                                 for s in summaries]))
+                                                             for k in summaries[0]["phases"]})
+    return results
+
+
+def run(seed=0, n_words=2000, n_solutions=100, n=200, load_db=True, pattern_matrix=None, repeats=3):
+    """
+    Runs all benchmarks on a random (seeded) subset of the words
+
+        Args:
+            seed (int):             Seed of the word subset and the random guesses
+            n_words (int):          Number of allowed words, all if None
+            n_solutions (int):      Number of solutions for the algorithm runs, all if None
+            n (int):                Number of calls per function benchmark
+            load_db (bool):         Benchmark load_entropy_db
+            pattern_matrix(PatternMatrix): Precomputed replies, only used if its words are the allowed words
+            repeats (int):          Number of runs of every benchmark (load_entropy_db once)
+
+        Returns:
+            results (dict):         meta data (including peak_rss_mb of the solver benchmarks, before
+                                    load_entropy_db) and benchmarks
+    """
+    rng = random.Random(seed)
+    solutions, all_allowed = load_words()
+    if n_solutions is not None:
+        solutions = rng.sample(solutions, n_solutions)
+    words = all_allowed
+    if n_words is not None:
+        words = sorted(set(rng.sample(all_allowed, max(n_words - len(solutions), 0))) | set(solutions))
+    if pattern_matrix is not None and pattern_matrix.guesses != words:
+        pattern_matrix = None
+
+    with open("all_allowed_freq_sigmoid.pkl", 'rb') as x:
+        freq_map = pickle.load(x)
+
+    benchmarks = bench_functions(words, solutions, freq_map, seed=seed, n=n, repeats=repeats)
+    benchmarks.update(bench_algorithm(words, solutions, freq_map, pattern_matrix=pattern_matrix, repeats=repeats))
+    # ru_maxrss is the peak of the whole process so far, so it is measured once for all solver benchmarks
+    peak = peak_rss_mb()
+    if load_db:  # last, the whole database raises the peak memory
+        benchmarks["load_entropy_db"] = bench_load_entropy_db()
+
+    meta = {"version": BENCH_VERSION, "seed": seed, "n_words": len(words), "n_solutions": len(solutions),
+            "n": n, "repeats": repeats, "pattern_matrix": pattern_matrix is not None, "peak_rss_mb": peak,
+            "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    return {"meta": meta, "benchmarks": benchmarks}
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compares benchmark results with a baseline and prints a table. ops/sec are the ones of the fastest
+    runs, p99 is only compared if both have at least MIN_P99_SAMPLES timed calls and it grew by more than
+    MIN_P99_CHANGE_MS
+
+        Args:
+            results (dict):     Results of run
+            baseline (dict):    Results of a previous run with the same seed and calls per function
+            tolerance (float):  Relative change that is accepted
+
+        Returns:
+            regressions (list): Names of benchmarks with less ops/sec or higher p99 than tolerance allows
+    """
+    for key in ["seed", "n"]:  # other guesses and candidates, the numbers can't be compared
+        if results["meta"][key] != baseline["meta"][key]:
+            raise Exception(f"baseline was run with {key} {baseline['meta'][key]}, "
+                            f"this run with {results['meta'][key]}")
+    if results["meta"]["n_words"] != baseline["meta"]["n_words"] or \
+            results["meta"]["n_solutions"] != baseline["meta"]["n_solutions"]:
+        print("Warning: baseline was run with different word lists")
+    peak, old_peak = results["meta"].get("peak_rss_mb"), baseline["meta"].get("peak_rss_mb")
+    if peak is not None and old_peak is not None:
+        print(f"Peak memory of the solver benchmarks: {peak:.1f} MB, baseline {old_peak:.1f} MB")
+
+    regressions = []
+    print(f"{'benchmark':<32}{'ops/sec':>14}{'baseline':>14}{'change':>9}{'p99 ms':>11}{'baseline':>11}")
+    for name, result in results["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if result is None or old is None:
+            continue
+        speed = result["ops_per_sec"] / old["ops_per_sec"] - 1
+        check_p99 = min(result.get("samples", 0), old.get("samples", 0)) >= MIN_P99_SAMPLES
+        regressed = speed < -tolerance or check_p99 and \
+            result["p99_ms"] - old["p99_ms"] > max(old["p99_ms"] * tolerance, MIN_P99_CHANGE_MS)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<32}{result['ops_per_sec']:>14.1f}{old['ops_per_sec']:>14.1f}{speed:>9.1%}"
+              f"{result['p99_ms']:>11.3f}{old['p99_ms']:>11.3f}{'' if check_p99 else ' (few)'}"
+              f"{'  <- regression' if regressed else ''}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the Wordle solver")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--words", type=int, default=2000, help="number of allowed words")
+    parser.add_argument("--solutions", type=int, default=100, help="number of solutions to solve")
+    parser.add_argument("--full", action="store_true", help="all allowed words and all 2309 solutions")
+    parser.add_argument("--calls", type=int, default=200, help="calls per function benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of every benchmark, the fastest counts")
+    parser.add_argument("--no-db", action="store_true", help="skip load_entropy_db")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as x:
+            baseline = json.load(x)
+        if (baseline["meta"]["seed"], baseline["meta"]["n"]) != (args.seed, args.calls):
+            parser.error(f"baseline was run with --seed {baseline['meta']['seed']} --calls {baseline['meta']['n']}")
+
+    pattern_matrix = wrdl.load_pattern_matrix() if os.path.exists(wrdl.PATTERN_MATRIX_FILE) else None
+    results = run(seed=args.seed, n_words=None if args.full else args.words,
+                  n_solutions=None if args.full else args.solutions, n=args.calls, load_db=not args.no_db,
+                  pattern_matrix=pattern_matrix, repeats=args.repeats)
+    with open(args.output, "w") as x:
+        json.dump(results, x, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,347 @@
+import bz2
+import os
+import pickle
+import sqlite3
+import struct
+import sys
+import zlib
+
+from collections import OrderedDict
+
+ENTROPY_DB_DIR = "entropy database"
+_DELTA_RECORD = struct.Struct("<IIi")  # length, crc32 of the entries, iteration
+
+
+def entropy_db_path(filename):
+    """
+    Path of the sqlite entropy database for a filename, e.g. "entropy_db" -> "entropy database/entropy_db.sqlite"
+    """
+    return os.path.join(ENTROPY_DB_DIR, f"{filename}.sqlite")
+
+
+def delta_log_path(filename):
+    """
+    Path of the delta log of a build run, e.g. "entropy_db" -> "entropy database/entropy_db.delta"
+    """
+    return os.path.join(ENTROPY_DB_DIR, f"{filename}.delta")
+
+
+class EntropyDB:
+    """
+    Entropy database stored in a sqlite table with one row per hash. Can be used wherever the
+    entropy_db dictionary is used (in, [], []=, len, update), but only reads the entries that are
+    looked up. Opening it takes milliseconds and memory only grows with the visited states.
+    New entries are appended and committed right away, nothing has to be rewritten.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._connection = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+        self._connection.execute("CREATE TABLE IF NOT EXISTS entropy (key PRIMARY KEY, value BLOB NOT NULL)")
+        self._connection.commit()
+
+    @staticmethod
+    def _dumps(value):
+        return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    @staticmethod
+    def _loads(blob):
+        return pickle.loads(zlib.decompress(blob))
+
+    def __contains__(self, key):
+        return self._connection.execute("SELECT 1 FROM entropy WHERE key = ?", (key,)).fetchone() is not None
+
+    def __getitem__(self, key):
+        row = self._connection.execute("SELECT value FROM entropy WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._loads(row[0])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def update(self, entries):
+        """Appends a dictionary of hashes with entropy lists in one transaction"""
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO entropy (key, value) VALUES (?, ?)",
+                                         ((k, self._dumps(v)) for k, v in entries.items()))
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM entropy").fetchone()[0]
+
+    def __iter__(self):
+        return (row[0] for row in self._connection.execute("SELECT key FROM entropy"))
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return ((k, self._loads(v)) for k, v in self._connection.execute("SELECT key, value FROM entropy"))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _sizeof(value):
+    # approximate memory of an entropy list: the list, its tuples and their elements
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_sizeof(x) for x in value)
+    return size
+
+
+class EntropyCache:
+    """
+    Memory bounded LRU cache in front of an entropy database. Can be used wherever the entropy_db
+    dictionary is used. Least recently used entries are evicted when max_entries or max_bytes is
+    exceeded. New entries are written to the store when they are evicted or on flush/close.
+    Counts hits (found in memory), store_hits (loaded from store), misses and evictions.
+
+        Args:
+            store (EntropyDB):  Persistent store, e.g. EntropyDB or a dict. Optional, if None
+                                evicted entries are dropped
+            max_entries (int):  Max number of entries in memory. Optional
+            max_bytes (int):    Max approximate memory of the entries in bytes. Optional
+    """
+
+    def __init__(self, store=None, max_entries=None, max_bytes=2 ** 30):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._dirty = set()
+
+    def _load(self, key):
+        # entry from memory or store, None if it doesn't exist
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+        value = self.store.get(key) if self.store is not None else None
+        if value is None:
+            self.misses += 1
+            return None
+        self.store_hits += 1
+        self._insert(key, value)
+        return value
+
+    def _insert(self, key, value):
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        size = _sizeof(value)
+        self._entries[key] = (value, size)
+        self.bytes += size
+
+        while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            old_key, (old_value, old_size) = self._entries.popitem(last=False)
+            self.bytes -= old_size
+            self.evictions += 1
+            if old_key in self._dirty:
+                self._dirty.discard(old_key)
+                if self.store is not None:
+                    self.store[old_key] = old_value
+
+    def get(self, key, default=None):
+        value = self._load(key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self._load(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self._entries or (self.store is not None and key in self.store)
+
+    def __setitem__(self, key, value):
+        self._dirty.add(key)
+        self._insert(key, value)
+
+    def update(self, entries):
+        for k, v in entries.items():
+            self[k] = v
+
+    def __len__(self):
+        if self.store is None:
+            return len(self._entries)
+        return len(self.store) + len([k for k in self._dirty if k not in self.store])
+
+    def flush(self):
+        """Writes new entries to the store"""
+        if self.store is not None and self._dirty:
+            self.store.update({k: self._entries[k][0] for k in self._dirty})
+        self._dirty.clear()
+
+    def stats(self):
+        """Dictionary with counters and memory usage"""
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+                "store_hits": self.store_hits, "misses": self.misses, "evictions": self.evictions}
+
+    def close(self):
+        self.flush()
+        if hasattr(self.store, "close"):
+            self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def import_entropy_db(filename, entropy_db, n=30):
+    """
+    Imports the pickled chunks written by Wordle_functions.save_entropy_db. Missing chunks are skipped
+
+        Args:
+            filename (str):         Filename of the chunks, e.g. "entropy_db"
+            entropy_db (EntropyDB): Database the entries are added to
+            n (int):                Number of chunks
+
+        Returns:
+            imported (int):         Number of imported entries
+    """
+    imported = 0
+    for i in range(n):
+        path = os.path.join(ENTROPY_DB_DIR, f"{filename}_{str(i)}.pkl")
+        if not os.path.exists(path):
+            continue
+        with bz2.BZ2File(path, 'rb') as x:
+            print(f"Importing database {i + 1}/{n}")
+            chunk = pickle.load(x)
+        entropy_db.update(chunk)
+        imported += len(chunk)
+
+    return imported
+
+
+def open_entropy_db(filename):
+    """
+    Opens the sqlite entropy database for a filename. When it is opened for the first time,
+    existing pickled chunks with the same filename are imported
+
+        Args:
+            filename (str):         Filename, e.g. "entropy_db"
+
+        Returns:
+            entropy_db (EntropyDB): The entropy database
+    """
+    path = entropy_db_path(filename)
+    new = not os.path.exists(path)
+    entropy_db = EntropyDB(path)
+    if new:
+        import_entropy_db(filename, entropy_db)
+    return entropy_db
+
+
+class DeltaLog:
+    """
+    Append-only log of a build run: one record per finished iteration (e.g. index of the solution) with
+    the entropy_db entries it calculated. Every record is written to disk right away, so a killed run
+    only loses the iterations that weren't finished. A torn record at the end is dropped when the log
+    is opened. compact merges the entries into the main store.
+
+        Args:
+            filename (str):     Path of the log, see delta_log_path. Created if it doesn't exist
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.done = set()  # finished iterations
+        end = 0
+        if os.path.exists(filename):
+            for iteration, blob, end in self._records():
+                self.done.add(iteration)
+            with open(filename, "r+b") as x:
+                x.truncate(end)
+        self._file = open(filename, "ab")
+
+    def _records(self):
+        # (iteration, compressed entries, end of the record) of all complete records
+        with open(self.filename, "rb") as x:
+            end = 0
+            while True:
+                header = x.read(_DELTA_RECORD.size)
+                if len(header) < _DELTA_RECORD.size:
+                    return
+                length, crc, iteration = _DELTA_RECORD.unpack(header)
+                blob = x.read(length)
+                if len(blob) < length or zlib.crc32(blob) != crc:
+                    return
+                end += _DELTA_RECORD.size + length
+                yield iteration, blob, end
+
+    @staticmethod
+    def _write(file, iteration, entries):
+        blob = zlib.compress(pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        file.write(_DELTA_RECORD.pack(len(blob), zlib.crc32(blob), iteration) + blob)
+
+    def append(self, iteration, entries):
+        """Writes the entries of a finished iteration and marks it as done"""
+        self._write(self._file, iteration, entries)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(iteration)
+
+    def entries(self):
+        """Yields the dictionaries of entries in the log"""
+        for iteration, blob, end in self._records():
+            entries = pickle.loads(zlib.decompress(blob))
+            if entries:
+                yield entries
+
+    def compact(self, entropy_db):
+        """
+        Merges the entries into entropy_db and rewrites the log with the finished iterations only.
+        Can be repeated after a crash, entries are simply written again
+
+            Args:
+                entropy_db (EntropyDB): Main store
+
+            Returns:
+                merged (int):           Number of merged entries
+        """
+        merged = 0
+        for entries in self.entries():
+            entropy_db.update(entries)
+            merged += len(entries)
+
+        self._file.close()
+        with open(self.filename + ".tmp", "wb") as x:
+            for iteration in sorted(self.done):
+                self._write(x, iteration, {})
+            x.flush()
+            os.fsync(x.fileno())
+        os.replace(self.filename + ".tmp", self.filename)
+        self._file = open(self.filename, "ab")
+        return merged
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,38 +1,61 @@
 import math
 import pickle
 import bz2
+import functools
+import itertools
+import os
+import struct
 import numpy as np
 
 
-def wordle_reply(solution, input):
+def wordle_reply(solution, input, code=False):
     """
     Wordle game
 
         Args:
-            solution (str):     5-Letter solution word
-            input (str):        5-Letter input to be evaluated
+            solution (str):     Solution word, usually 5 letters
+            input (str):        Input to be evaluated, same length as solution
+            code (bool):        If true, returns the reply code (see reply_to_code) without building the list
 
         Returns:
-            output (list):      List of 5 integers in Wordle logi
+            output (list):      List of one integer per letter in Wordle logi
                 2 = green:          letter placed correctly
                 1 = yellow:         letter in the word but in wrong place
                 0 = grey:           character not in word
     """
-    if len(input) != 5:
-        raise Exception("input needs to be 5 characters")
-    output = [0] * 5
+    length = len(solution)
+    if len(input) != length:
+        raise Exception(f"input needs to be {length} characters")
+    if code:
+        # letters of the solution that aren't green, yellows use them up from left to right
+        left = {}
+        for s, g in zip(solution, input):
+            if s != g:
+                left[s] = left.get(s, 0) + 1
+        output = 0
+        for s, g in zip(solution, input):
+            if s == g:
+                output = output * 3 + 2
+            elif left.get(g):
+                left[g] -= 1
+                output = output * 3 + 1
+            else:
+                output = output * 3
+        return output
+
+    output = [0] * length
     solution = list(solution)
     input = list(input)
 
     # Check correctly placed chars
-    for i in range(0, 5):
+    for i in range(0, length):
         if input[i] == solution[i]:
             output[i] = 2
             solution[i] = 0
             input[i] = False
 
     # Check incorrectly placed chars
-    for i in range(0, 5):
+    for i in range(0, length):
         if input[i]:
             if input[i] in solution:
                 output[i] = 1
@@ -41,12 +64,107 @@ def wordle_reply(solution, input):
     return output
 
 
-def wordle_print(reply):
+def reply_dtype(length):
+    """
+    Smallest unsigned integer type that holds every reply code of words with length letters:
+    uint8 up to 5 letters (3^5 = 243 codes), uint16 up to 10 letters
+
+        Args:
+            length (int):   Number of letters
+
+        Returns:
+            dtype (type):   numpy integer type
+    """
+    if 3 ** length <= 2 ** 8:
+        return np.uint8
+    if 3 ** length <= 2 ** 16:
+        return np.uint16
+    return np.uint32
+
+
+def _words_to_array(words):
+    # list of n words with the same length -> (n, length) uint8 array of letters
+    if isinstance(words, np.ndarray):
+        return words
+    return np.frombuffer("".join(words).encode("ascii"), dtype=np.uint8).reshape(len(words), -1)
+
+
+def _reply_codes(guesses, solutions):
+    """
+    Calculates the reply codes (see reply_to_code) of m guesses against n solutions with numpy.
+    Same logic as wordle_reply: greens are marked first, then yellows from left to right,
+    every letter of the solution can only be used once.
+
+        Args:
+            guesses (np.array):     (m, length) uint8 array of letters
+            solutions (np.array):   (n, length) uint8 array of letters
+
+        Returns:
+            codes (np.array):       (m, n) array of reply codes, dtype see reply_dtype
+    """
+    length = guesses.shape[1]
+    dtype = reply_dtype(length)
+    g = guesses[:, None, :]
+    s = solutions[None, :, :]
+    green = g == s  # (m, n, length)
+    codes = np.zeros((guesses.shape[0], solutions.shape[0]), dtype=dtype)
+
+    for i in range(length):
+        # letters of the solution that are not used by a green yet
+        available = ((s == g[:, :, i, None]) & ~green).sum(axis=2, dtype=np.uint8)
+        # same letter earlier in the guess that is not green uses up one of them
+        used = np.zeros_like(available)
+        for j in range(i):
+            used += (g[:, :, j] == g[:, :, i]) & ~green[:, :, j]
+        yellow = ~green[:, :, i] & (available > used)
+        codes *= 3
+        codes += (2 * green[:, :, i] + yellow).astype(dtype)
+    return codes
+
+
+def wordle_reply_batch(solutions, input, chunk_size=256, chunk_cells=2 ** 21):
+    """
+    Wordle game for many words at once. Same logic as wordle_reply, but evaluates one or
+    multiple inputs against multiple solutions with numpy and returns reply codes (see reply_to_code)
+
+        Args:
+            solutions (list):       Solution words (str) or (n, length) uint8 array of letters. Can be a single str
+            input (list):           Inputs to be evaluated (str) or (m, length) uint8 array of letters. Can be a single str
+            chunk_size (int):       Max number of inputs evaluated at once. Limits memory usage
+            chunk_cells (int):      Max number of input x solution cells evaluated at once, so large word lists
+                                    use fewer inputs per chunk. Memory per chunk is ~length * 3 bytes per cell
+
+        Returns:
+            codes (np.array):       array of reply codes with shape (m, n), dtype see reply_dtype.
+                                    Dimensions given as single str are dropped, e.g. (n,) for a single input
+    """
+    single_solution = isinstance(solutions, str)
+    single_input = isinstance(input, str)
+    solutions = _words_to_array([solutions] if single_solution else solutions)
+    input = _words_to_array([input] if single_input else input)
+    if input.shape[1] != solutions.shape[1]:
+        raise Exception(f"input needs to be {solutions.shape[1]} characters")
+
+    codes = np.empty((input.shape[0], solutions.shape[0]), dtype=reply_dtype(input.shape[1]))
+    chunk_size = max(1, min(chunk_size, chunk_cells // max(solutions.shape[0], 1)))
+    for start in range(0, input.shape[0], chunk_size):
+        codes[start:start + chunk_size] = _reply_codes(input[start:start + chunk_size], solutions)
+
+    if single_solution:
+        codes = codes[:, 0]
+    if single_input:
+        codes = codes[0]
+    return codes
+
+
+def wordle_print(reply, length=5):
     # reply either [0, 0, 0, 0, 0]
     # or "00000"
+    # or reply code e.g. 143 (length letters)
 
     if type(reply) == str:
         reply = [int(d) for d in str(reply)]
+    reply = as_reply(reply, length)
 
     output_str = ""
     for element in reply:
@@ -59,26 +177,81 @@ def wordle_print(reply):
     return output_str
 
 
-def filter_words(guess, answer, allowed_words):
+def reply_to_code(reply):
+    """
+    Encodes a wordle reply as base 3 integer. First letter is the most significant digit,
+    so the code of a reply equals its index in wordle_reply_generator()
+
+        Args:
+            reply (list):   List of integers, one per letter, e.g. [1, 2, 0, 2, 2] = 🟨🟩⬜🟩🟩
+
+        Returns:
+            code (int):     Integer between 0 and 3^length - 1 (242 for 5 letters), e.g. [1, 2, 0, 2, 2] -> 143
+    """
+    code = 0
+    for element in reply:
+        code = code * 3 + element
+    return code
+
+
+def code_to_reply(code, length=5):
+    """
+    Decodes a base 3 integer (see reply_to_code) to a wordle reply
+
+        Args:
+            code (int):     Integer between 0 and 3^length - 1
+            length (int):   Number of letters of the reply
+
+        Returns:
+            reply (list):   List of length integers, e.g. 143 -> [1, 2, 0, 2, 2]
+    """
+    reply = [0] * length
+    for i in range(length - 1, -1, -1):
+        code, reply[i] = divmod(int(code), 3)
+    return reply
+
+
+def as_reply(reply, length=5):
+    """
+    Reply as list, for functions that accept replies as list or as reply code
+
+        Args:
+            reply (list):   List of int, e.g. [1, 2, 0, 2, 2], or reply code, e.g. 143
+            length (int):   Number of letters of the reply
+
+        Returns:
+            reply (list):   List of int
+    """
+    if isinstance(reply, (int, np.integer)):
+        return code_to_reply(reply, length)
+    return reply
+
+
+def filter_words(guess, answer, allowed_words, word_filter=None):
     """
     Filters solution space from received information
 
         Args:
             guess (str):            The guess for which reply was received (e.g. "hello")
-            answer(list):           List of int, e.g. [1, 2, 0, 2, 2] = 🟨🟩⬜🟩🟩
+            answer(list):           List of int, e.g. [1, 2, 0, 2, 2] = 🟨🟩⬜🟩🟩, or reply code, e.g. 143
             allowed_words (list):   List of strings with allowed words. This list will be filtered
+            word_filter (WordFilter): Index over a word list containing allowed_words. Optional, much faster
             
 
         Returns:
             allowed_words (list):    List of possible solutions after filtering out impossible words.
     """
+    if word_filter is not None:
+        return word_filter.filter(guess, answer, allowed_words)
+    answer = as_reply(answer, len(guess))
+    length = len(guess)
 
     letter_count = {}
 
     # letter in word at correct place. Rejects all words where the letter is not in that position
     # Example: guess: moose, solution: bones -> all words without o at second position are rejected
     if 2 in answer:
-        for i in range(5):
+        for i in range(length):
             letter = guess[i]
             if answer[i] == 2:
                 allowed_words = list(filter(lambda x: x.startswith(letter, i), allowed_words))
@@ -92,7 +265,7 @@ def filter_words(guess, answer, allowed_words):
     # all words with s at position 1 are rejected
     # all words that don't have an s are rejected
     if 1 in answer:
-        for i in range(5):
+        for i in range(length):
             letter = guess[i]
 
             if answer[i] == 1:
@@ -110,7 +283,7 @@ def filter_words(guess, answer, allowed_words):
     # all words with y are rejected
     # although reply for letter s at position 3 is 0, only words with s at position 3 are rejected, because it must be in the word somewhere
     if 0 in answer:
-        for i in range(5):
+        for i in range(length):
             letter = guess[i]
             if answer[i] == 0:
                 if not letter in letter_count:
@@ -127,8 +300,8 @@ def filter_words(guess, answer, allowed_words):
     # letters too often in word
     # Example: guess = "sissy", reply = [0,0,0,2,0]: "frass" needs to be filtered out
     for letter in letter_count:
-        for i in range(6 - 1):
-            for j in range(i + 1, 6 - 1):
+        for i in range(length):
+            for j in range(i + 1, length):
                 if guess[i] == guess[j] and guess[i] == letter:
                     if (answer[i] >= 1 and answer[j] == 0) or (answer[j] == 2 and answer[i] == 0):
                         allowed_words = [k for k in allowed_words if k.count(letter) == letter_count[letter]]
@@ -136,24 +309,220 @@ def filter_words(guess, answer, allowed_words):
     return allowed_words
 
 
-def wordle_reply_generator():
+class Vocabulary:
+    """
+    Word list stored as arrays: letters as (n, length) uint8 array (a = 0), number of every letter
+    per word as (n, 26) uint8 array and a word -> index dictionary. Sets of words, e.g. the possible
+    solutions, can be index arrays or boolean masks over the vocabulary instead of lists of strings.
+
+        Args:
+            words (list):       Words (str) with the same length, e.g. sorted(all_allowed)
+    """
+
+    def __init__(self, words):
+        self.words = list(words)
+        self.index = {w: i for i, w in enumerate(self.words)}
+        if len(self.index) != len(self.words):
+            raise Exception("words of a vocabulary need to be unique")
+        self.letters = _words_to_array(self.words) - ord("a")
+        self.length = self.letters.shape[1]
+        self.counts = np.zeros((len(self.words), 26), dtype=np.uint8)
+        np.add.at(self.counts, (np.arange(len(self.words))[:, None], self.letters), 1)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def indices(self, words):
+        """
+        Index array of a set of words
+
+            Args:
+                words (list):       List of words (str), boolean mask or index array
+
+            Returns:
+                indices (np.array): int64 array of positions in the vocabulary
+        """
+        if isinstance(words, np.ndarray):
+            if words.dtype == bool:
+                return np.flatnonzero(words)
+            return words.astype(np.int64, copy=False)
+        return np.fromiter((self.index[w] for w in words), dtype=np.int64, count=len(words))
+
+    def mask(self, words):
+        """Boolean mask of a set of words (list of words, mask or index array)"""
+        if isinstance(words, np.ndarray) and words.dtype == bool:
+            return words
+        mask = np.zeros(len(self.words), dtype=bool)
+        mask[self.indices(words)] = True
+        return mask
+
+    def subset(self, words):
+        """List of words (str) of a set of words (list of words, mask or index array)"""
+        return [self.words[i] for i in self.indices(words)]
+
+
+class WordFilter:
+    """
+    Index over a word list to filter it like filter_words, but in one pass. Masks of words with
+    letter x at position i and of words with at least k times letter x are precomputed once, so
+    a guess/reply pair (or a whole history of them) is just an intersection of those masks.
+    Returns exactly the same words as filter_words.
+
+        Args:
+            word_list (list):   Words (str) or Vocabulary
+    """
+
+    def __init__(self, word_list):
+        self.vocabulary = word_list if isinstance(word_list, Vocabulary) else Vocabulary(word_list)
+        self.words = self.vocabulary.words
+        self.index = self.vocabulary.index
+        letters = self.vocabulary.letters
+        self.length = self.vocabulary.length
+
+        # _position[i, x]: words with letter x at position i
+        self._position = letters.T[:, None, :] == np.arange(26)[None, :, None]
+        self._not_position = ~self._position
+        # _min_count[x, k]: words with letter x at least k times
+        counts = self.vocabulary.counts.T
+        self._min_count = counts[:, None, :] >= np.arange(self.length + 2)[None, :, None]
+        self._not_min_count = ~self._min_count
+
+    def mask(self, guess, answer):
+        """
+        Boolean mask over the word list of words that are left after receiving answer for guess
+
+            Args:
+                guess (str):        The guess for which reply was received (e.g. "hello")
+                answer(list):       List of int, e.g. [1, 2, 0, 2, 2] = 🟨🟩⬜🟩🟩, or reply code
+
+            Returns:
+                mask (np.array):    Boolean array with one entry per word of the word list
+        """
+        answer = as_reply(answer, self.length)
+        letter_count = {}
+        for i in range(self.length):
+            if answer[i] >= 1:
+                letter_count[guess[i]] = letter_count.get(guess[i], 0) + 1
+
+        mask = np.ones(len(self.words), dtype=bool)
+        for i in range(self.length):
+            x = ord(guess[i]) - ord("a")
+            if answer[i] == 2:  # letter at that position
+                mask &= self._position[i, x]
+            elif answer[i] == 1 or guess[i] in letter_count:  # letter not at that position
+                mask &= self._not_position[i, x]
+            else:  # letter not in word
+                mask &= self._not_min_count[x, 1]
+
+        for letter, count in letter_count.items():
+            x = ord(letter) - ord("a")
+            # letter at least as often as green + yellow
+            mask &= self._min_count[x, count]
+            # letter exactly as often as green + yellow if also grey. Same pairs as in filter_words
+            for i in range(self.length):
+                for j in range(i + 1, self.length):
+                    if guess[i] == guess[j] == letter:
+                        if (answer[i] >= 1 and answer[j] == 0) or (answer[j] == 2 and answer[i] == 0):
+                            mask &= self._not_min_count[x, count + 1]
+        return mask
+
+    def hard_mode_mask(self, guess, answer, indices=None):
+        """
+        Boolean mask of words that are legal guesses in hard mode after receiving answer for guess:
+        green letters stay at their position and green + yellow letters are used at least as often.
+        Words don't need to be possible solutions, grey letters may be used again
+
+            Args:
+                guess (str):        The guess for which reply was received (e.g. "hello")
+                answer(list):       List of int, e.g. [1, 2, 0, 2, 2] = 🟨🟩⬜🟩🟩, or reply code
+                indices (np.array): Only evaluate these words of the word list, e.g. the legal guesses
+                                    before this reply. Optional, the whole word list if None
+
+            Returns:
+                mask (np.array):    Boolean array with one entry per word of the word list or of indices
+        """
+        answer = as_reply(answer, self.length)
+        select = slice(None) if indices is None else indices
+        letter_count = {}
+        mask = np.ones(len(self.words) if indices is None else len(indices), dtype=bool)
+        for i in range(self.length):
+            if answer[i] == 2:
+                mask &= self._position[i, ord(guess[i]) - ord("a")][select]
+            if answer[i] >= 1:
+                letter_count[guess[i]] = letter_count.get(guess[i], 0) + 1
+        for letter, count in letter_count.items():
+            mask &= self._min_count[ord(letter) - ord("a"), count][select]
+        return mask
+
+    def history_mask(self, history):
+        """Boolean mask of words left after a list of (guess, answer) tuples"""
+        mask = np.ones(len(self.words), dtype=bool)
+        for guess, answer in history:
+            mask &= self.mask(guess, answer)
+        return mask
+
+    def indices(self, word_list):
+        """Positions of the words of word_list (list of words, mask or index array) in the index"""
+        return self.vocabulary.indices(word_list)
+
+    def filter(self, guess, answer, allowed_words=None):
+        """Same as filter_words(guess, answer, allowed_words). Filters the whole word list if allowed_words is None"""
+        return self.filter_history([(guess, answer)], allowed_words)
+
+    def filter_history(self, history, allowed_words=None):
+        """
+        Words of allowed_words (or of the whole word list) left after a list of (guess, answer) tuples.
+        If allowed_words is a mask or an index array, the result is one as well
+        """
+        return self._apply(self.history_mask(history), allowed_words)
+
+    def filter_hard_mode(self, guess, answer, legal_words=None):
+        """
+        Legal guesses of legal_words (or of the whole word list) in hard mode after receiving answer
+        for guess (see hard_mode_mask). Filtering the legal guesses of the previous turn again keeps
+        them up to date. If legal_words is a mask or an index array, the result is one as well
+        """
+        if isinstance(legal_words, np.ndarray) and legal_words.dtype != bool:
+            return legal_words[self.hard_mode_mask(guess, answer, legal_words)]
+        return self._apply(self.hard_mode_mask(guess, answer), legal_words)
+
+    def _apply(self, mask, allowed_words):
+        # words of allowed_words (or of the whole word list) in mask, same type as allowed_words
+        if allowed_words is None:
+            return [self.words[i] for i in np.flatnonzero(mask)]
+        if isinstance(allowed_words, np.ndarray):
+            if allowed_words.dtype == bool:
+                return allowed_words & mask
+            return allowed_words[mask[allowed_words]]
+        keep = mask[self.indices(allowed_words)]
+        return [w for w, k in zip(allowed_words, keep) if k]
+
+
+def wordle_reply_generator(length=5):
     """
     Generates reply_map with all possible wordl replies. Example reply: [1, 2, 0, 2, 2]           
 
+        Args:
+            length (int):       Number of letters, there are 3^length replies
+
         Returns:
             reply_map (list):   list of list of all possible wordl replies
     """
-    reply_map = []
-    for a in range(0, 22223):
-        sub_list = [int(d) for d in "{:05d}".format(a)]
-        reply_map.append(sub_list)
+    # same order as counting in base 3, so the index of a reply is its reply code
+    return [list(reply) for reply in itertools.product(range(3), repeat=length)]
+
 
-    for number in range(3, 10):
-        reply_map = [k for k in reply_map if not number in k]
-    return reply_map
+@functools.lru_cache(maxsize=4)
+def _default_reply_map(length=5):
+    # built on first use instead of at import
+    return wordle_reply_generator(length)
 
 
-def guess_probability_map(guess, word_list, freq_map, reply_map=wordle_reply_generator(), ):
+def guess_probability_map(guess, word_list, freq_map, reply_map=None, word_filter=None,
+                          bucket=False, pattern_matrix=None):
     """
     Calculates how likely each wordle reply (e.g. [0 0 1 0 0]) is for a given guess,
     word_list (i.e. possible solutions) and reply_map (i.e. possible replies)
@@ -161,15 +530,22 @@ def guess_probability_map(guess, word_list, freq_map, reply_map=wordle_reply_gen
         Args:
             guess (str):        The guessed word
             word_list (list):   Possible solutions
-            reply_map (list):   Possible replies. Will be filtered for invalid replies
+            reply_map (list):   Possible replies, as lists or reply codes (e.g. range(3 ** 5)).
+                                Will be filtered for invalid replies. All if None
             freq_map (dict):    Dictionary of words (key) and frequency (value)
+            word_filter (WordFilter): Index over a word list containing word_list. Optional, much faster
+            bucket (bool):      If true, sorts word_list by reply to guess in one pass instead of
+                                calling filter_words for every reply. Same result, much faster
+            pattern_matrix (PatternMatrix): Precomputed replies for bucket mode. Optional
 
         Returns:
-            prob_list (list):   list of tuples with replies and probability of that reply
+            prob_list (list):   list of tuples with replies (same form as in reply_map) and probability of that reply
     """
 
     prob_list = []
     check_replies = False
+    if reply_map is None:
+        reply_map = _default_reply_map(len(guess))
     # if not freq_map: 
     #     freq_map = {k: (1/len(word_list)) for k in word_list}
     # else:
@@ -179,19 +555,38 @@ def guess_probability_map(guess, word_list, freq_map, reply_map=wordle_reply_gen
     if len(freq_map) < len(word_list) or round(sum(freq_map.values()), 10) != 1:
         raise Exception(f"something is wrong with freq_map {len(freq_map) - len(word_list)}\t{sum(freq_map.values())}")
 
+    if bucket:
+        # every possible solution gives exactly one reply -> histogram of reply codes weighted by freq
+        if pattern_matrix is not None:
+            codes = pattern_matrix.row(guess, word_list)
+        else:
+            codes = wordle_reply_batch(word_list, guess)
+        probs = np.bincount(codes, weights=[freq_map[x] for x in word_list], minlength=3 ** len(guess))
+
+        for reply in reply_map:
+            prob = float(probs[reply if isinstance(reply, (int, np.integer)) else reply_to_code(reply)])
+            if prob != 0:
+                prob_list.append((reply, prob))
+        return prob_list
+
     for c in guess:
         if guess.count(c) > 0:
             check_replies = True
             break
 
-    for reply in reply_map:
+    if word_filter is not None:
+        word_indices = word_filter.indices(word_list)
+        word_freq = np.array([freq_map[x] for x in word_list])
+
+    for reply_or_code in reply_map:
+        reply = as_reply(reply_or_code, len(guess))
         # check if reply makes sense -> e.g. for word sissy a reply [0 0 1 0 0] doesnt make sense
         # because if s is in word it would only be [1 0 0 0 0]/[2 0 0 0 0]/[0 0 0 2 0]/[1 0 0 2 0] etc.
         # In other words, it checkes if a letter in guess is twice and if yes it 
         if check_replies:
             invalid_reply = False
-            for i in range(5):
-                for j in range(i + 1, 5):
+            for i in range(len(guess)):
+                for j in range(i + 1, len(guess)):
                     if guess[i] == guess[j]:
                         if reply[j] == 1 and reply[i] == 0:
                             invalid_reply = True
@@ -200,12 +595,15 @@ def guess_probability_map(guess, word_list, freq_map, reply_map=wordle_reply_gen
                 continue
 
         # create prob_list
-        matches = filter_words(guess, reply, allowed_words=word_list)
-        matches_freq = [freq_map[x] for x in matches]
-        prob = sum(matches_freq)
+        if word_filter is None:
+            matches = filter_words(guess, reply, allowed_words=word_list)
+            matches_freq = [freq_map[x] for x in matches]
+            prob = sum(matches_freq)
+        else:
+            prob = float(word_freq[word_filter.mask(guess, reply)[word_indices]].sum())
 
         if prob != 0:
-            prob_list.append((reply, prob))
+            prob_list.append((reply_or_code, prob))
 
     return prob_list
 
@@ -232,7 +630,8 @@ def expected_entropy_from_map(probability_map):
     return e
 
 
-def expected_entropy_from_word(guess, word_list, reply_map=wordle_reply_generator(), freq_map={}):
+def expected_entropy_from_word(guess, word_list, reply_map=None, freq_map={}, word_filter=None,
+                               bucket=False, pattern_matrix=None):
     """
     Calculates how likely each wordle reply (e.g. [0 0 1 0 0]) is for a given guess,
     word_list (i.e. possible solutions) and reply_map (i.e. possible replies) and then
@@ -241,22 +640,244 @@ def expected_entropy_from_word(guess, word_list, reply_map=wordle_reply_generato
         Args:
             guess (str):        The guessed word
             word_list (list):   Possible solutions
-            reply_map (list):   Possible replies. Will be filtered for invalid replies
+            reply_map (list):   Possible replies. Will be filtered for invalid replies. All if None
             freq_map (dict):    Dictionary of words (key) and frequency (value)
+            word_filter (WordFilter): Index over a word list containing word_list. Optional, much faster
+            bucket (bool):      Calculates the probabilities in one pass, see guess_probability_map
+            pattern_matrix (PatternMatrix): Precomputed replies for bucket mode. Optional
 
         Returns:
             e (float):          expected entropy E[I] in bits
     """
+    if reply_map is None:
+        reply_map = _default_reply_map(len(guess))
     if not freq_map:
         freq_map_standardised = {k: (1 / len(word_list)) for k in word_list}
     elif len(freq_map) != len(reply_map):
         freq_map_standardised = standardize_freq_map(freq_map, word_list)
 
-    prob = guess_probability_map(guess, word_list, freq_map_standardised, reply_map=reply_map)
+    prob = guess_probability_map(guess, word_list, freq_map_standardised, reply_map=reply_map,
+                                 word_filter=word_filter, bucket=bucket, pattern_matrix=pattern_matrix)
     e = expected_entropy_from_map(prob)
     return e
 
 
+def expected_entropies(guesses, word_list, freq_map=None, pattern_matrix=None, chunk_cells=2 ** 22,
+                       executor=None, shards=None, vocabulary=None):
+    """
+    Calculates the expected entropy E[I] of every guess at once. Same result as calling
+    expected_entropy_from_word for every guess, but freq_map is standardized only once and
+    the reply distributions of many guesses are calculated in one numpy operation
+
+        Args:
+            guesses (list):     Guesses (str) to be evaluated, e.g. all allowed words
+            word_list (list):   Possible solutions
+            freq_map (dict):    Dictionary of words (key) and frequency (value). Does not need to be
+                                standardized. Uniform if empty
+            pattern_matrix (PatternMatrix): Precomputed replies. Optional, replies are calculated otherwise
+            chunk_cells (int):  Max number of guess x solution cells (or guess x reply cells, 3^length per
+                                guess) evaluated at once. Limits memory usage, also for long words
+            executor (Executor): concurrent.futures executor. Optional, if given the guesses are split
+                                into shards that are evaluated in parallel. Memory mapped pattern
+                                matrices are reopened by process pools instead of copied
+            shards (int):       Number of shards for executor. Defaults to the number of CPUs
+            vocabulary (Vocabulary): If given, guesses and word_list can also be index arrays or masks
+                                over the vocabulary
+
+        Returns:
+            e (np.array):       expected entropy E[I] in bits for every guess
+    """
+    if vocabulary is not None:
+        guesses = vocabulary.indices(guesses)
+        word_list = vocabulary.indices(word_list)
+    weights = _standardized_weights(word_list, freq_map, vocabulary)
+
+    if executor is None:
+        return _expected_entropies(guesses, word_list, weights, pattern_matrix, chunk_cells, vocabulary)
+
+    size = -(-len(guesses) // (shards or os.cpu_count() or 1))
+    parts = [guesses[i:i + size] for i in range(0, len(guesses), size)]
+    n = len(parts)
+    results = executor.map(_expected_entropies, parts, [word_list] * n, [weights] * n, [pattern_matrix] * n,
+                           [chunk_cells] * n, [vocabulary] * n)
+    return np.concatenate(list(results))
+
+
+def _standardized_weights(word_list, freq_map, vocabulary=None):
+    # freq_map of word_list (words or vocabulary indices) as array that sums up to 1, uniform if empty
+    if freq_map:
+        words = word_list if vocabulary is None else (vocabulary.words[i] for i in word_list)
+        weights = np.fromiter((freq_map[x] for x in words), dtype=np.float64, count=len(word_list))
+    else:
+        weights = np.ones(len(word_list))
+    return weights / weights.sum()
+
+
+def _reply_chunks(guesses, word_list, chunk_size, pattern_matrix=None, vocabulary=None):
+    # (start, reply codes of chunk_size guesses from start against word_list), looked up or calculated
+    if pattern_matrix is not None:
+        guess_rows = pattern_matrix.guess_rows(guesses, vocabulary)
+        solution_columns = pattern_matrix.solution_columns(word_list, vocabulary)
+    elif vocabulary is not None:
+        guesses_array = vocabulary.letters[guesses]
+        solutions_array = vocabulary.letters[word_list]
+    else:
+        guesses_array = _words_to_array(guesses)
+        solutions_array = _words_to_array(word_list)
+
+    for start in range(0, len(guesses), chunk_size):
+        if pattern_matrix is not None:
+            yield start, pattern_matrix.data[guess_rows[start:start + chunk_size]][:, solution_columns]
+        else:
+            yield start, wordle_reply_batch(solutions_array, guesses_array[start:start + chunk_size])
+
+
+def _entropy_rows(probs):
+    # entropy in bits of every distribution along the last axis
+    plogp = np.zeros_like(probs)
+    nonzero = probs > 0
+    plogp[nonzero] = probs[nonzero] * np.log2(probs[nonzero])
+    return -plogp.sum(axis=-1)
+
+
+def _expected_entropies(guesses, word_list, weights, pattern_matrix=None, chunk_cells=2 ** 22, vocabulary=None):
+    # expected_entropies for standardized weights (np.array aligned with word_list)
+    n_codes = 3 ** (len(guesses[0]) if vocabulary is None else vocabulary.length)
+    # one chunk holds (guesses x solutions) codes and (guesses x n_codes) histograms, for long words the
+    # histograms can be larger than the codes
+    chunk_size = max(1, chunk_cells // max(len(word_list), n_codes))
+
+    e = np.empty(len(guesses))
+    for start, codes in _reply_chunks(guesses, word_list, chunk_size, pattern_matrix, vocabulary):
+        # one weighted histogram over reply codes per guess, offset by row so one bincount does all rows
+        m = codes.shape[0]
+        offsets = codes + (np.arange(m) * n_codes)[:, None]
+        probs = np.bincount(offsets.ravel(), weights=np.tile(weights, m), minlength=m * n_codes)
+        e[start:start + m] = _entropy_rows(probs.reshape(m, n_codes))
+
+    return e
+
+
+def expected_entropies_boards(guesses, boards, freq_map=None, pattern_matrix=None, chunk_cells=2 ** 22,
+                              vocabulary=None):
+    """
+    Expected entropy E[I] of every guess on every board of a multi-board game (e.g. Quordle), where one
+    guess is played against several hidden words at once. Same result as calling expected_entropies
+    for every board, but the replies are calculated once per guess and word in the union of the
+    boards, and the reply distributions of all boards are one weighted histogram per guess. The
+    hidden words are independent, so the joint E[I] of a guess is the sum over its boards
+
+        Args:
+            guesses (list):     Guesses (str) to be evaluated, e.g. all allowed words
+            boards (list):      Possible solutions of every board, lists of words (or index arrays/masks
+                                if vocabulary is given). Boards can share words
+            freq_map (dict):    Dictionary of words (key) and frequency (value). Does not need to be
+                                standardized. Uniform if empty
+            pattern_matrix (PatternMatrix): Precomputed replies. Optional, replies are calculated otherwise
+            chunk_cells (int):  Max number of guess x solution cells (summed over boards) or guess x reply
+                                cells evaluated at once. Limits memory usage
+            vocabulary (Vocabulary): If given, guesses and boards can also be index arrays or masks
+                                over the vocabulary
+
+        Returns:
+            e (np.array):       (len(guesses), len(boards)) array of E[I] in bits
+    """
+    if vocabulary is not None:
+        guesses = vocabulary.indices(guesses)
+        boards = [vocabulary.indices(board) for board in boards]
+        union, inverse = np.unique(np.concatenate(boards), return_inverse=True)
+    else:
+        union = list(dict.fromkeys(w for board in boards for w in board))
+        position = {w: i for i, w in enumerate(union)}
+        inverse = np.fromiter((position[w] for board in boards for w in board), dtype=np.int64)
+    weights = np.concatenate([_standardized_weights(board, freq_map, vocabulary) for board in boards])
+    n_boards = len(boards)
+    n_codes = 3 ** (len(guesses[0]) if vocabulary is None else vocabulary.length)
+    # histogram bin of every (board, reply), the solutions of a board are next to each other in inverse
+    bins = np.repeat(np.arange(n_boards) * n_codes, [len(board) for board in boards])
+    chunk_size = max(1, chunk_cells // max(len(inverse), n_boards * n_codes))
+
+    e = np.empty((len(guesses), n_boards))
+    for start, codes in _reply_chunks(guesses, union, chunk_size, pattern_matrix, vocabulary):
+        m = codes.shape[0]
+        offsets = codes[:, inverse] + bins + (np.arange(m) * n_boards * n_codes)[:, None]
+        probs = np.bincount(offsets.ravel(), weights=np.tile(weights, m), minlength=m * n_boards * n_codes)
+        e[start:start + m] = _entropy_rows(probs.reshape(m, n_boards, n_codes))
+
+    return e
+
+
+def entropy_upper_bounds(guesses, word_list, freq_map=None, vocabulary=None):
+    """
+    Cheap upper bound of the expected entropy E[I] of every guess, without reply distributions.
+    The entropy of a reply is at most the sum of the entropies of its colors per position. The
+    color distribution of a position only needs the (weighted) number of possible solutions with
+    letter x at position i and with letter x anywhere. It is exact for letters that appear once in
+    the guess, for repeated letters yellow/grey is counted as 1 bit. E[I] is also never higher than
+    the entropy of the possible solutions, use np.minimum with entropy_from_distribution for that
+
+        Args:
+            guesses (list):     Guesses (str) to be evaluated, e.g. all allowed words
+            word_list (list):   Possible solutions
+            freq_map (dict):    Dictionary of words (key) and frequency (value). Does not need to be
+                                standardized. Uniform if empty
+            vocabulary (Vocabulary): If given, guesses and word_list can also be index arrays or masks
+                                over the vocabulary
+
+        Returns:
+            bounds (np.array):  upper bound of E[I] in bits for every guess
+    """
+    if vocabulary is not None:
+        guesses = vocabulary.indices(guesses)
+        word_list = vocabulary.indices(word_list)
+        guess_letters = vocabulary.letters[guesses]
+        guess_counts = vocabulary.counts[guesses]
+        solution_letters = vocabulary.letters[word_list]
+        solution_counts = vocabulary.counts[word_list]
+    else:
+        guess_letters = _words_to_array(guesses) - ord("a")
+        solution_letters = _words_to_array(word_list) - ord("a")
+        guess_counts = np.zeros((len(guess_letters), 26), dtype=np.uint8)
+        np.add.at(guess_counts, (np.arange(len(guess_letters))[:, None], guess_letters), 1)
+        solution_counts = np.zeros((len(solution_letters), 26), dtype=np.uint8)
+        np.add.at(solution_counts, (np.arange(len(solution_letters))[:, None], solution_letters), 1)
+    if freq_map:
+        words = word_list if vocabulary is None else (vocabulary.words[i] for i in word_list)
+        weights = np.fromiter((freq_map[x] for x in words), dtype=np.float64, count=len(word_list))
+    else:
+        weights = np.ones(len(word_list))
+    weights /= weights.sum()
+    length = guess_letters.shape[1]
+
+    # at_position[i, x]: probability of letter x at position i, anywhere[x]: probability of letter x in the word
+    at_position = np.stack([np.bincount(solution_letters[:, i], weights=weights, minlength=26)
+                            for i in range(length)])
+    anywhere = weights @ (solution_counts > 0)
+
+    positions = np.arange(length)
+    green = np.minimum(at_position[positions, guess_letters], 1)  # (guesses, length)
+    not_green = np.maximum(1 - green, 0)
+    yellow = np.clip(anywhere[guess_letters] - green, 0, None)  # for letters that appear once in the guess
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yellow = np.where(not_green > 1e-12, np.minimum(yellow / not_green, 1), 0)
+    single = np.take_along_axis(guess_counts, guess_letters, axis=1) == 1
+    # repeated letter: yellow is possible if the letter is in a possible solution other than at this position
+    elsewhere = (anywhere[guess_letters] - green) > 1e-12
+    not_green_entropy = np.where(single, _binary_entropy(yellow), elsewhere.astype(np.float64))
+
+    return (_binary_entropy(green) + not_green * not_green_entropy).sum(axis=1)
+
+
+def _binary_entropy(p):
+    # entropy in bits of a yes/no event with probability p, element wise
+    p = np.clip(p, 0, 1)
+    h = np.zeros_like(p)
+    inside = (p > 0) & (p < 1)
+    q = p[inside]
+    h[inside] = -(q * np.log2(q) + (1 - q) * np.log2(1 - q))
+    return h
+
+
 def standardize_freq_map(freq_map, word_list):
     """
     Standardizes a freq_map (dict) given a word list. Sum of freq_map will be set to 1
@@ -270,8 +891,9 @@ def standardize_freq_map(freq_map, word_list):
             freq_map_standardised (dict):   Standardized dictionary of words (key) and frequency (value)
     """
     freq_map_standardised = {k: v for (k, v) in freq_map.items()}
+    word_set = set(word_list)
     for k in freq_map_standardised.keys():
-        if k not in word_list: freq_map_standardised[k] = 0.0
+        if k not in word_set: freq_map_standardised[k] = 0.0
 
     total = sum(freq_map_standardised.values())
     freq_map_standardised = {k: (v / total) for (k, v) in freq_map_standardised.items()}
@@ -297,6 +919,95 @@ def entropy_from_distribution(freq_map, word_list):
     return inf
 
 
+class WeightModel:
+    """
+    Word frequencies (e.g. all_allowed_freq_sigmoid from Wordle_algo.apply_sigmoid) as an array aligned
+    with a vocabulary. Gives the standardized distribution and the entropy of a set of possible
+    solutions in one numpy step, instead of standardize_freq_map and entropy_from_distribution
+    rebuilding a dictionary of all words. Uses H = log2(S) - T / S with S = sum of weights and
+    T = sum of weight * log2(weight) of the possible solutions, see WeightState.
+
+        Args:
+            vocabulary (Vocabulary): Words, a list is turned into a Vocabulary
+            freq_map (dict):    Dictionary of words (key) and frequency (value). Does not need to be
+                                standardized. Uniform if empty
+    """
+
+    def __init__(self, vocabulary, freq_map=None):
+        self.vocabulary = vocabulary if isinstance(vocabulary, Vocabulary) else Vocabulary(vocabulary)
+        if freq_map:
+            self.weights = np.fromiter((freq_map[w] for w in self.vocabulary.words), dtype=np.float64,
+                                       count=len(self.vocabulary))
+        else:
+            self.weights = np.ones(len(self.vocabulary))
+        self.weight_log_weights = np.zeros_like(self.weights)
+        nonzero = self.weights > 0
+        self.weight_log_weights[nonzero] = self.weights[nonzero] * np.log2(self.weights[nonzero])
+
+    def state(self, words=None):
+        """WeightState of a set of possible solutions (list of words, mask or index array), all words if None"""
+        indices = np.arange(len(self.vocabulary)) if words is None else self.vocabulary.indices(words)
+        return WeightState(self, indices, float(self.weights[indices].sum()),
+                           float(self.weight_log_weights[indices].sum()))
+
+    def probabilities(self, words):
+        """Same as standardize_freq_map(freq_map, words) as array aligned with the vocabulary"""
+        return self.state(words).probabilities()
+
+    def entropy(self, words):
+        """Same as entropy_from_distribution(freq_map, words)"""
+        return self.state(words).entropy
+
+
+class WeightState:
+    """
+    Possible solutions with the sums needed for their distribution and entropy (see WeightModel).
+    filter updates the sums incrementally: only the words that are removed or the words that are
+    left are summed, whichever are fewer
+    """
+
+    def __init__(self, model, indices, total, total_log):
+        self.model = model
+        self.indices = indices
+        self.total = total
+        self.total_log = total_log
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def entropy(self):
+        """Entropy of the distribution of the possible solutions in bits"""
+        if self.total <= 0:
+            return 0.0
+        return max(math.log2(self.total) - self.total_log / self.total, 0.0)
+
+    def probabilities(self):
+        """Standardized distribution of the possible solutions as array aligned with the vocabulary"""
+        p = np.zeros(len(self.model.weights))
+        p[self.indices] = self.model.weights[self.indices] / self.total
+        return p
+
+    def filter(self, words):
+        """
+        State after the possible solutions are reduced to words
+
+            Args:
+                words (list):       Remaining possible solutions (list of words, mask or index array),
+                                    a subset of the current ones
+
+            Returns:
+                state (WeightState): New state, this one is not changed
+        """
+        indices = self.model.vocabulary.indices(words)
+        if 2 * len(indices) <= len(self.indices):
+            return WeightState(self.model, indices, float(self.model.weights[indices].sum()),
+                               float(self.model.weight_log_weights[indices].sum()))
+        removed = np.setdiff1d(self.indices, indices, assume_unique=True)
+        return WeightState(self.model, indices, self.total - float(self.model.weights[removed].sum()),
+                           self.total_log - float(self.model.weight_log_weights[removed].sum()))
+
+
 def save_entropy_db(entropy_db, filename, n=30):
     """
     Saves entropy_db to pickled databases in multiple chunks
@@ -329,7 +1040,8 @@ def save_entropy_db(entropy_db, filename, n=30):
 
 def load_entropy_db(filename, n=30):
     """
-    Loads entropy_db from multiple chunked files
+    Loads entropy_db from multiple chunked files. Missing chunks are skipped.
+    For large databases use Wordle_db.open_entropy_db, which only loads the entries that are used
 
         Args:
             n (int):            Number of chunks
@@ -341,6 +1053,9 @@ def load_entropy_db(filename, n=30):
     #    filename = str(input("What filename? e.g. entropy_db "))
 
     for i in range(n):
+        if not os.path.exists(f'entropy database/{filename}_{str(i)}.pkl'):
+            print(f"Skipping missing database {i + 1}/{n}")
+            continue
         with bz2.BZ2File(f'entropy database/{filename}_{str(i)}.pkl', 'rb') as x:
             print(f"Loading database {i + 1}/{n}")
             entropy_db.update(pickle.load(x))
@@ -348,6 +1063,228 @@ def load_entropy_db(filename, n=30):
     return entropy_db
 
 
+def save_games_jsonl(games, filename, append=True):
+    """
+    Writes every game from Wordle_algo.wordle_algorithm_4_iter to a file as one line of json as soon
+    as it is finished. Memory stays constant and the file can be read while the run continues
+
+        Args:
+            games (iterable):   Games, e.g. wordle_algorithm_4_iter(...)
+            filename (str):     Path of the file
+            append (bool):      Appends to an existing file, otherwise it is overwritten
+
+        Returns:
+            n (int):            Number of games written
+    """
+    n = 0
+    with open(filename, "a" if append else "w") as x:
+        for game in games:
+            x.write(json.dumps(game) + "\n")
+            x.flush()
+            n += 1
+    return n
+
+
+def load_games_jsonl(filename):
+    """
+    Reads the games written by save_games_jsonl one at a time. An incomplete last line
+    (e.g. from a crash while writing) is skipped
+
+        Args:
+            filename (str):     Path of the file
+
+        Yields:
+            game (dict):        Game as yielded by wordle_algorithm_4_iter
+    """
+    with open(filename, "r") as x:
+        for line in x:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
+
+
+PATTERN_MATRIX_FILE = "pattern_matrix.bin"
+PATTERN_MATRIX_VERSION = 1
+_PATTERN_MAGIC = b"WRDLPTRN"
+_PATTERN_HEADER = struct.Struct("<8sHHII")  # magic, version, word length, n guesses, n solutions
+_PATTERN_ALIGN = 64
+
+
+def build_pattern_matrix(guesses, solutions=None, filename=PATTERN_MATRIX_FILE, chunk_size=1024):
+    """
+    Calculates the reply code (see reply_to_code) of every guess against every solution once
+    and saves the matrix (1 byte per cell, 2 bytes for 6 to 10 letters, see reply_dtype) to a
+    versioned binary file that can be memory mapped with load_pattern_matrix. For all 12972
+    allowed words the file has ~170 MB.
+
+        Args:
+            guesses (list):     List of strings with allowed guesses (rows)
+            solutions (list):   List of strings with possible solutions (columns). Defaults to guesses
+            filename (str):     Path of the file
+            chunk_size (int):   Number of guesses calculated at once. Limits memory usage
+
+        Returns:
+            pattern_matrix (PatternMatrix): The memory mapped matrix
+    """
+    if solutions is None:
+        solutions = guesses
+    length = len(guesses[0])
+    if any(len(w) != length for w in guesses) or any(len(w) != length for w in solutions):
+        raise Exception(f"all words need to be {length} characters")
+
+    header = _PATTERN_HEADER.pack(_PATTERN_MAGIC, PATTERN_MATRIX_VERSION, length, len(guesses), len(solutions))
+    header += "".join(guesses).encode("ascii") + "".join(solutions).encode("ascii")
+    offset = -(-len(header) // _PATTERN_ALIGN) * _PATTERN_ALIGN
+
+    with open(filename, "wb") as x:
+        x.write(header.ljust(offset, b"\0"))
+
+    data = np.memmap(filename, dtype=reply_dtype(length), mode="r+", offset=offset,
+                     shape=(len(guesses), len(solutions)))
+    guesses_array = _words_to_array(guesses)
+    solutions_array = _words_to_array(solutions)
+    for start in range(0, len(guesses), chunk_size):
+        data[start:start + chunk_size] = wordle_reply_batch(solutions_array, guesses_array[start:start + chunk_size])
+    data.flush()
+    del data
+
+    return load_pattern_matrix(filename)
+
+
+def load_pattern_matrix(filename=PATTERN_MATRIX_FILE):
+    """
+    Opens a pattern matrix saved by build_pattern_matrix. The matrix is memory mapped, so
+    nothing is calculated or read upfront and all processes share the same pages of the OS cache.
+
+        Args:
+            filename (str):     Path of the file
+
+        Returns:
+            pattern_matrix (PatternMatrix): The memory mapped matrix
+    """
+    with open(filename, "rb") as x:
+        magic, version, length, n_guesses, n_solutions = _PATTERN_HEADER.unpack(x.read(_PATTERN_HEADER.size))
+        if magic != _PATTERN_MAGIC:
+            raise Exception(f"{filename} is not a pattern matrix")
+        if version != PATTERN_MATRIX_VERSION:
+            raise Exception(f"{filename} has version {version}, expected {PATTERN_MATRIX_VERSION}. "
+                            f"Please rebuild it with build_pattern_matrix")
+        words = x.read(length * (n_guesses + n_solutions)).decode("ascii")
+
+    words = [words[i:i + length] for i in range(0, len(words), length)]
+    offset = -(-(_PATTERN_HEADER.size + len(words) * length) // _PATTERN_ALIGN) * _PATTERN_ALIGN
+    data = np.memmap(filename, dtype=reply_dtype(length), mode="r", offset=offset, shape=(n_guesses, n_solutions))
+    return PatternMatrix(data, words[:n_guesses], words[n_guesses:])
+
+
+@functools.lru_cache(maxsize=4)
+def _open_pattern_matrix(filename):
+    # load_pattern_matrix, opened only once per process when unpickled
+    return load_pattern_matrix(filename)
+
+
+class PatternMatrix:
+    """
+    Matrix of reply codes of guesses (rows) against solutions (columns). Usually memory mapped
+    from a file (see build_pattern_matrix and load_pattern_matrix), but data can be any array,
+    e.g. in shared memory.
+
+        Args:
+            data (np.array):    (len(guesses), len(solutions)) array of reply codes, dtype see reply_dtype
+            guesses (list):     Guesses (str) of the rows
+            solutions (list):   Solutions (str) of the columns
+    """
+
+    def __init__(self, data, guesses, solutions):
+        self.data = data
+        self.length = len(guesses[0])
+        self.guesses = list(guesses)
+        self.solutions = list(solutions)
+        self.guess_index = {w: i for i, w in enumerate(self.guesses)}
+        self.solution_index = {w: i for i, w in enumerate(self.solutions)}
+
+    def __reduce__(self):
+        # memory mapped matrices are reopened by other processes instead of copying the data
+        if isinstance(self.data, np.memmap) and self.data.filename:
+            return _open_pattern_matrix, (self.data.filename,)
+        return PatternMatrix, (np.asarray(self.data), self.guesses, self.solutions)
+
+    def code(self, solution, input):
+        """Reply code (see reply_to_code) of input for solution"""
+        return int(self.data[self.guess_index[input], self.solution_index[solution]])
+
+    def reply(self, solution, input):
+        """Same as wordle_reply(solution, input), but looked up instead of calculated"""
+        return code_to_reply(self.code(solution, input), self.length)
+
+    def row(self, guess, word_list=None):
+        """Reply codes of guess against all solutions or only against the words in word_list"""
+        row = self.data[self.guess_index[guess]]
+        if word_list is None:
+            return row
+        return row[[self.solution_index[w] for w in word_list]]
+
+    @staticmethod
+    def _positions(words, index, names, vocabulary):
+        # positions in the matrix of words (str) or of vocabulary indices
+        if vocabulary is None:
+            return np.fromiter((index[w] for w in words), dtype=np.int64, count=len(words))
+        if names == vocabulary.words:
+            return np.asarray(words)
+        return np.fromiter((index[w] for w in vocabulary.words), dtype=np.int64, count=len(vocabulary))[words]
+
+    def guess_rows(self, guesses, vocabulary=None):
+        """Rows of guesses (list of str, or index array if vocabulary is given)"""
+        return self._positions(guesses, self.guess_index, self.guesses, vocabulary)
+
+    def solution_columns(self, solutions, vocabulary=None):
+        """Columns of solutions (list of str, or index array if vocabulary is given)"""
+        return self._positions(solutions, self.solution_index, self.solutions, vocabulary)
+
+
+# version 2: model_hash includes the value format. Keys of version 1 could hold either format
+_STATE_VERSION = 2
+
+# formats of the values stored in entropy_db. They are part of model_hash, so they never share keys
+ENTROPY_LIST = "entropy_list"  # list of (E[I], probability, word), see Wordle_algo.entropies_for_state
+ENTROPY_FLOATS = "entropy_floats"  # list of E[I] in sorted(allowed_words) order, see Multiproc_db
+
+
+def model_hash(freq_map, guesses, value_format=ENTROPY_LIST):
+    """
+    Fingerprint of the weight model, of the guesses an entropy list is calculated for and of the
+    format of the stored entropy list. Calculate it once per run and pass it to state_hash
+
+        Args:
+            freq_map (dict):    Dictionary of words (key) and frequency (value)
+            guesses (list):     Allowed guesses (str)
+            value_format (str): ENTROPY_LIST or ENTROPY_FLOATS
+
+        Returns:
+            hash (bytes):       see get_hash
+    """
+    return get_hash([sorted(guesses), sorted(freq_map.items()), value_format])
+
+
+def state_hash(candidates, model):
+    """
+    Canonical key of a game state for entropy_db: the set of remaining possible solutions and the
+    model_hash. Different guess/reply histories that leave the same candidates get the same key
+
+        Args:
+            candidates (list):  Remaining possible solutions, in any order
+            model (bytes):      Output of model_hash
+
+        Returns:
+            hash (bytes):       16 bytes. The first byte is the version, keys of get_hash have version 0
+    """
+    digest = hashlib.md5(model)
+    digest.update(",".join(sorted(candidates)).encode("ascii"))
+    return _STATE_VERSION.to_bytes(1, "big") + digest.digest()[:-1]
+
+
 """
 Generate stable hashes for Python data objects.
 Contains no business logic.
@@ -1,4 +1,5 @@
 import csv
+import os
 import random
 # import math
 import inquirer
@@ -7,6 +8,10 @@ import inquirer
 # import matplotlib.pyplot as plt
 import Wordle_functions as wrdl
 import Wordle_algo as algo
+import Wordle_db as wdb
+import Wordle_trace as wtr
+
+from concurrent.futures import ThreadPoolExecutor
 
 # from time import sleep
 # from scipy.special import expit #sigmoid function
@@ -30,7 +35,8 @@ possible_algorithms = [
 options = [
     inquirer.Checkbox('options',
                       message="Which options",
-                      choices=['Verbose', "Manual", "Progress bar", "Minimize guesses"],
+                      choices=['Verbose', "Manual", "Progress bar", "Minimize guesses", "Parallel", "Trace",
+                               "Hard mode"],
                       )
 ]
 known_solution = [
@@ -68,6 +74,7 @@ else:
 manual = "Manual" in answers["options"]
 verbose = "Verbose" in answers["options"]
 bar = "Progress bar" in answers["options"]
+hard_mode = "Hard mode" in answers["options"]
 if "Minimize guesses" in answers["options"]:
     custom_score = (-0.012405539570697632, 0.3642899622411526, 1.1890485932345454)
 else:
@@ -81,10 +88,17 @@ if answers["algorithm"][-1] == "2":
                                           allowed_words=all_allowed)
 
 if answers["algorithm"][-1] in ["3", "4"]:
-    filename = input("Which filename?\n")
-    print("\nLoading data from previous games")
-    entropy_db = wrdl.load_entropy_db(filename)
-    print(f"{len(entropy_db)} hashes imported\n")
+    filename = input("Which filename? Leave empty to calculate without database\n")
+    entropy_db = None
+    if filename:
+        print("\nLoading data from previous games")
+        entropy_db = wdb.EntropyCache(wdb.open_entropy_db(filename))
+        print(f"{len(entropy_db)} hashes available\n")
+
+    pattern_matrix = wrdl.load_pattern_matrix() if os.path.exists(wrdl.PATTERN_MATRIX_FILE) else None
+    # numpy releases the GIL for most of the entropy kernel, so threads use multiple cores
+    executor = ThreadPoolExecutor() if "Parallel" in answers["options"] else None
+    tracer = wtr.Tracer(enabled="Trace" in answers["options"])
 
 if answers["algorithm"][-1] == "3":
     # loading word frequency dataset and creating dictionary of word frequency for all allowed words
@@ -98,7 +112,11 @@ if answers["algorithm"][-1] == "3":
                                       verbose=verbose,
                                       manual=manual,
                                       bar=bar,
-                                      custom_score=(0, 0, 0))
+                                      custom_score=(0, 0, 0),
+                                      pattern_matrix=pattern_matrix,
+                                      executor=executor,
+                                      tracer=tracer,
+                                      hard_mode=hard_mode)
 
 if answers["algorithm"][-1] == "4":
     # loading word frequency dataset and creating dictionary of word frequency for all allowed words
@@ -130,7 +148,16 @@ if answers["algorithm"][-1] == "4":
                                       verbose=verbose,
                                       manual=manual,
                                       bar=bar,
-                                      custom_score=custom_score)
+                                      custom_score=custom_score,
+                                      pattern_matrix=pattern_matrix,
+                                      executor=executor,
+                                      tracer=tracer,
+                                      hard_mode=hard_mode)
+
+if answers["algorithm"][-1] in ["3", "4"] and tracer.enabled:
+    tracer.print_summary()
+    tracer.save("wordle_trace.trace.json")
+    print("Trace saved to wordle_trace.trace.json")
 
 try:
     tries = sum(i[-1][0] for i in list(history.values()))
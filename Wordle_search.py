@@ -0,0 +1,190 @@
+import argparse
+import csv
+import os
+import pickle
+
+import numpy as np
+import Wordle_functions as wrdl
+import Wordle_algo as algo
+
+from time import perf_counter
+
+CUSTOM_SCORE = (-0.012405539570697632, 0.3642899622411526, 1.1890485932345454)
+
+
+class _Timeout(Exception):
+    # time budget of a decision is used up, the current depth is abandoned
+    pass
+
+
+class LookaheadSearch:
+    """
+    Chooses guesses by minimizing the expected number of guesses to solve over multiple plies instead
+    of the greedy score of algorithm mark 4. A guess costs 1 plus, for every reply but solved, the
+    probability of the reply times the value of the candidates that are left. Sets of 1 or 2
+    candidates are valued exactly. At the depth limit the value is the expected number of guesses
+    when algorithm mark 4 plays on from there, so the search never chooses a guess that is worse
+    than the greedy one by that measure. Only the beam best guesses of a state by the greedy score
+    (algo.best_guesses) are searched, best first, and a guess is dropped as soon as its cost can't
+    beat the best one. Values are kept in a transposition table keyed by the candidate set, so
+    states that are reached by different histories or in later decisions and games are searched once.
+    Every decision deepens one ply at a time until depth or time_budget is reached.
+
+        Args:
+            allowed_words (list):   List of strings with allowed words
+            freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
+            custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
+            depth (int):            Number of plies (own guesses) that are searched exactly
+            beam (int):             Number of guesses searched per state
+            time_budget (float):    Seconds per decision. Optional, if None every decision searches depth plies
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            weight_model(WeightModel): wrdl.WeightModel of freq_map over allowed_words. Optional
+    """
+
+    def __init__(self, allowed_words, freq_map, custom_score=(0, 0, 0), depth=2, beam=8, time_budget=None,
+                 pattern_matrix=None, weight_model=None):
+        self.allowed_words = sorted(allowed_words)
+        self.freq_map = freq_map
+        self.custom_score = custom_score
+        self.depth = depth
+        self.beam = beam
+        self.time_budget = time_budget
+        self.pattern_matrix = pattern_matrix
+        self.weight_model = weight_model or wrdl.WeightModel(self.allowed_words, freq_map)
+        self.vocabulary = self.weight_model.vocabulary
+        self.table = {}  # (candidate indices as bytes, depth) -> (expected guesses, guess)
+        self._solved = 3 ** self.vocabulary.length - 1
+        if pattern_matrix is not None:
+            self._rows = pattern_matrix.guess_rows(np.arange(len(self.vocabulary)), self.vocabulary)
+
+    def best_guess(self, reduced_list):
+        """
+        Best guess for the remaining possible solutions
+
+            Args:
+                reduced_list (list):    Remaining possible solutions (list of words, mask or index array)
+
+            Returns:
+                guess (str):            Best guess
+                expected (float):       Expected number of guesses to solve, including this one
+        """
+        candidates = np.sort(self.vocabulary.indices(reduced_list))
+        if len(candidates) <= 2:
+            guess = candidates[np.argmax(self._probabilities(candidates))]
+            return self.vocabulary.words[guess], self._value(candidates, 0, None)
+
+        deadline = None if self.time_budget is None else perf_counter() + self.time_budget
+        best = None
+        for depth in range(1, self.depth + 1):
+            key = (candidates.tobytes(), depth)
+            try:
+                if key not in self.table:
+                    self.table[key] = self._search(candidates, depth, deadline)
+            except _Timeout:
+                break
+            best = self.table[key]
+        if best is None:  # not even one ply in time, greedy guess
+            guess = self._moves(candidates)[0]
+            return self.vocabulary.words[guess], float("nan")
+        expected, guess = best
+        return self.vocabulary.words[guess], expected
+
+    def _moves(self, candidates, k=None):
+        # k (default beam) best guesses by the greedy score as vocabulary indices, best first
+        inf = self.weight_model.entropy(candidates)
+        score_list = algo.best_guesses(self.allowed_words, candidates, self.freq_map, inf, 1, self.custom_score,
+                                       k=k or self.beam, pattern_matrix=self.pattern_matrix,
+                                       weight_model=self.weight_model)
+        return [self.vocabulary.index[x[-1]] for x in score_list]
+
+    def _probabilities(self, candidates):
+        # standardized weights of candidates, aligned with candidates
+        weights = self.weight_model.weights[candidates]
+        if weights.sum() > 0:
+            return weights / weights.sum()
+        return np.full(len(candidates), 1 / len(candidates))
+
+    def _split(self, guess, candidates, p):
+        # (probability, candidates) of every reply of guess except solved, most likely first
+        if self.pattern_matrix is not None:
+            codes = self.pattern_matrix.data[self._rows[guess]][
+                self.pattern_matrix.solution_columns(candidates, self.vocabulary)]
+        else:
+            letters = self.vocabulary.letters
+            codes = wrdl.wordle_reply_batch(letters[candidates], letters[[guess]])[0]
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        branches = []
+        for start, end in zip(starts, np.r_[starts[1:], len(codes)]):
+            if codes[start] != self._solved:
+                branch = order[start:end]
+                branches.append((float(p[branch].sum()), candidates[branch]))
+        return sorted(branches, key=lambda x: -x[0])
+
+    def _value(self, candidates, depth, deadline):
+        # expected number of guesses to solve candidates, including the last one
+        if len(candidates) == 1:
+            return 1.0
+        if len(candidates) == 2:  # guess the more likely one
+            return 2 - float(self._probabilities(candidates).max())
+        key = (candidates.tobytes(), depth)
+        if key not in self.table:
+            if depth == 0:
+                # play on with the greedy guess of algorithm mark 4
+                if deadline is not None and perf_counter() > deadline:
+                    raise _Timeout()
+                guess = self._moves(candidates, k=1)[0]
+                p = self._probabilities(candidates)
+                self.table[key] = (1 + sum(prob * self._value(branch, 0, deadline)
+                                           for prob, branch in self._split(guess, candidates, p)), guess)
+            else:
+                self.table[key] = self._search(candidates, depth, deadline)
+        return self.table[key][0]
+
+    def _search(self, candidates, depth, deadline):
+        # (expected guesses, guess) of the best of the beam guesses, searching depth plies
+        if deadline is not None and perf_counter() > deadline:
+            raise _Timeout()
+        p = self._probabilities(candidates)
+        best = (float("inf"), None)
+        for guess in self._moves(candidates):
+            branches = self._split(guess, candidates, p)
+            # every branch needs at least one more guess, replaced by its value when it is searched
+            cost = 1 + sum(prob for prob, _ in branches)
+            for prob, branch in branches:
+                if cost >= best[0]:
+                    break
+                cost += prob * (self._value(branch, depth - 1, deadline) - 1)
+            if cost < best[0]:
+                best = (cost, guess)
+        return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares lookahead search with algorithm mark 4")
+    parser.add_argument("--solutions", type=int, default=100, help="number of solutions to solve")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--beam", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=None, help="seconds per decision")
+    args = parser.parse_args()
+
+    # Importing solutions and allowed words to lists
+    csv_reader = csv.reader(open('solutions.csv', 'r'))
+    solutions = list(csv_reader)[0]  # contains all possible solutions
+    csv_reader = csv.reader(open('allowed_words.csv', 'r'))
+    allowed_words = list(csv_reader)[0]  # contains allowed words beside solutions
+    all_allowed = allowed_words + solutions
+
+    with open("all_allowed_freq_sigmoid.pkl", 'rb') as x:
+        all_allowed_freq_sigmoid = pickle.load(x)
+    pattern_matrix = wrdl.load_pattern_matrix() if os.path.exists(wrdl.PATTERN_MATRIX_FILE) else None
+
+    search = LookaheadSearch(all_allowed, all_allowed_freq_sigmoid, CUSTOM_SCORE, depth=args.depth, beam=args.beam,
+                             time_budget=args.budget, pattern_matrix=pattern_matrix)
+    for name, kwargs in [("algorithm mark 4", {}), (f"search depth {args.depth} beam {args.beam}", {"search": search})]:
+        history = algo.wordle_algorithm_4(solutions=solutions[:args.solutions], allowed_words=all_allowed,
+                                          freq_map=all_allowed_freq_sigmoid, custom_score=CUSTOM_SCORE,
+                                          pattern_matrix=pattern_matrix, **kwargs)
+        tries = [len(x) for x in history.values()]
+        print(f"{name}:\tAverage number of tries {sum(tries) / len(tries):.4}, {len([x for x in tries if x > 6])} losses")
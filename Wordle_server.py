@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import pickle
+
+import Wordle_functions as wrdl
+import Wordle_algo as algo
+import Wordle_db as wdb
+
+from concurrent.futures import ThreadPoolExecutor
+
+CUSTOM_SCORE = (-0.012405539570697632, 0.3642899622411526, 1.1890485932345454)
+
+
+class Solver:
+    """
+    Algorithm mark 4 for a single guess/reply history. Word lists, freq map, word filter and
+    entropy database stay in memory between requests. Everything that takes CPU time runs in
+    executor. The entropy database (lookups unpickle, new entries are measured and can be written
+    to sqlite) is only used from one extra thread, so the event loop never blocks and the database
+    is never used concurrently. Concurrent requests for the same state wait for one lookup and
+    calculation. Call close when done.
+
+        Args:
+            allowed_words (list):   List of strings with allowed words
+            freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
+            custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
+            entropy_db(dict):       Dictionary of hashes (see wrdl.state_hash) with entropy list or
+                                    Wordle_db.EntropyCache. Optional
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            executor(Executor):     concurrent.futures executor for the calculations. Optional, threads if None
+    """
+
+    def __init__(self, allowed_words, freq_map, custom_score=(0, 0, 0), entropy_db=None, pattern_matrix=None,
+                 executor=None):
+        self.allowed_words = sorted(allowed_words)
+        self.freq_map = freq_map
+        self.custom_score = custom_score
+        self.entropy_db = {} if entropy_db is None else entropy_db
+        self.pattern_matrix = pattern_matrix
+        self.executor = executor or ThreadPoolExecutor()
+        self.word_filter = wrdl.WordFilter(self.allowed_words)
+        self.weight_model = wrdl.WeightModel(self.word_filter.vocabulary, freq_map)
+        self.model = wrdl.model_hash(freq_map, self.allowed_words)
+        self._db_executor = ThreadPoolExecutor(max_workers=1)  # every use of entropy_db, in order
+        self._pending = {}  # state hash -> task of the lookup and calculation
+
+    def _reduce(self, history):
+        reduced_list = self.word_filter.filter_history(history)
+        return reduced_list, self.weight_model.entropy(reduced_list)
+
+    async def _load_or_calculate(self, cur_hash, reduced_list):
+        # entropy list of a state from entropy_db, calculated and stored if it isn't there
+        loop = asyncio.get_running_loop()
+        entropies_list_all = await loop.run_in_executor(self._db_executor, self.entropy_db.get, cur_hash)
+        if entropies_list_all is None:
+            entropies_list_all = await loop.run_in_executor(self.executor, algo.entropies_for_state,
+                                                            self.allowed_words, reduced_list, self.freq_map,
+                                                            self.pattern_matrix, None, None, self.weight_model)
+            # not awaited, the answer doesn't wait for it. Later lookups are queued behind it
+            loop.run_in_executor(self._db_executor, self.entropy_db.__setitem__, cur_hash, entropies_list_all)
+        return entropies_list_all
+
+    async def _entropies(self, reduced_list):
+        cur_hash = wrdl.state_hash(reduced_list, self.model)
+        if cur_hash not in self._pending:
+            task = asyncio.ensure_future(self._load_or_calculate(cur_hash, reduced_list))
+            task.add_done_callback(lambda _: self._pending.pop(cur_hash, None))
+            self._pending[cur_hash] = task
+        # a cancelled request doesn't cancel the calculation other requests wait for
+        return await asyncio.shield(self._pending[cur_hash])
+
+    def close(self):
+        """Waits for queued writes and closes entropy_db"""
+        self._db_executor.shutdown(wait=True)
+        if hasattr(self.entropy_db, "close"):
+            self.entropy_db.close()
+
+    async def next_guesses(self, history, k=5):
+        """
+        Best guesses after history
+
+            Args:
+                history (list):     List of (guess, reply), reply as list of int e.g. [1, 2, 0, 2, 2] or reply code
+                k (int):            Number of guesses
+
+            Returns:
+                result (dict):      candidates (number of possible solutions), entropy (bits left) and
+                                    guesses: list of dicts with word, expected_entropy, probability and score,
+                                    best first
+        """
+        history = [(guess, wrdl.code_to_reply(reply, len(guess)) if isinstance(reply, int) else reply)
+                   for guess, reply in history]
+        for guess, reply in history:
+            if guess not in self.word_filter.index:
+                raise Exception(f"{guess} is not an allowed word")
+            if len(reply) != len(guess) or any(x not in (0, 1, 2) for x in reply):
+                raise Exception(f"invalid reply {reply} for {guess}")
+        if history and sum(history[-1][1]) == 2 * len(history[-1][0]):
+            return {"candidates": 1, "entropy": 0.0, "guesses": [], "solved": True}
+
+        loop = asyncio.get_running_loop()
+        reduced_list, inf = await loop.run_in_executor(self.executor, self._reduce, history)
+        if not reduced_list:
+            raise Exception("no possible solution left, check the replies")
+        if len(reduced_list) == 1:
+            guesses = [{"word": reduced_list[0], "expected_entropy": 0.0, "probability": 1.0, "score": 0.0}]
+        else:
+            entropies_list_all = await self._entropies(reduced_list)
+            score_list = await loop.run_in_executor(self.executor, algo.score_guesses, entropies_list_all, inf,
+                                                    len(history) + 1, self.custom_score, k)
+            guesses = [{"word": word, "expected_entropy": EI, "probability": p, "score": -score}
+                       for score, EI, p, word in score_list]
+        return {"candidates": len(reduced_list), "entropy": inf, "guesses": guesses, "solved": False}
+
+    async def handle(self, reader, writer):
+        """
+        One connection: every line is a json request {"history": [[guess, reply], ...], "k": 5, "id": ...},
+        every answer is one line of json with the same id. Requests of a connection are answered in order
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    answer = await self.next_guesses(request.get("history", []), int(request.get("k", 5)))
+                except Exception as e:
+                    answer = {"error": str(e)}
+                answer["id"] = request_id
+                writer.write((json.dumps(answer) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(solver, host="127.0.0.1", port=8765, path=None):
+    """
+    Runs the server until it is cancelled. Listens on the unix socket path if given, otherwise on host:port
+    """
+    if path:
+        server = await asyncio.start_unix_server(solver.handle, path=path)
+        print(f"Listening on {path}")
+    else:
+        server = await asyncio.start_server(solver.handle, host=host, port=port)
+        print(f"Listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Next guess service, one json request per line")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="path of a unix socket instead of host:port")
+    # entropy_db_freq is built by Multiproc_db.py in another format (wrdl.ENTROPY_FLOATS)
+    parser.add_argument("--db", default="entropy_db", help="entropy database, empty for none")
+    parser.add_argument("--uniform", action="store_true", help="algorithm mark 3: uniform freq, no custom score")
+    args = parser.parse_args()
+
+    # Importing solutions and allowed words to lists
+    csv_reader = csv.reader(open('solutions.csv', 'r'))
+    solutions = list(csv_reader)[0]  # contains all possible solutions
+    csv_reader = csv.reader(open('allowed_words.csv', 'r'))
+    allowed_words = list(csv_reader)[0]  # contains allowed words beside solutions
+    all_allowed = allowed_words + solutions
+
+    if args.uniform:
+        freq_map = {word: 1 for word in all_allowed}
+        custom_score = (0, 0, 0)
+    else:
+        with open("all_allowed_freq_sigmoid.pkl", 'rb') as x:
+            freq_map = pickle.load(x)
+        custom_score = CUSTOM_SCORE
+
+    entropy_db = wdb.EntropyCache(wdb.open_entropy_db(args.db)) if args.db else None
+    pattern_matrix = wrdl.load_pattern_matrix() if os.path.exists(wrdl.PATTERN_MATRIX_FILE) else None
+    solver = Solver(all_allowed, freq_map, custom_score, entropy_db=entropy_db, pattern_matrix=pattern_matrix)
+    try:
+        asyncio.run(serve(solver, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        solver.close()
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+
+
+class _Phase:
+    # records one timed phase when the with block ends
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self.args
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, **self.args)
+        return False
+
+
+class _NullPhase:
+    # used when tracing is switched off, does nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Tracer:
+    """
+    Low overhead timers and counters for the solver. Phases are timed with
+    `with tracer.phase("name", **args) as args:` (args can be added inside the block) or
+    `start = tracer.start()` ... `tracer.record("name", start, **args)`.
+    Counters are increased with tracer.count("name"). If enabled is False, nothing is recorded.
+
+        Args:
+            enabled (bool):     Record phases and counters
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.events = []  # tuples (name, start ns, duration ns, thread id, args)
+        self.counters = {}
+        self._origin = time.perf_counter_ns()
+
+    def phase(self, name, **args):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, args)
+
+    def start(self):
+        """Start time for record"""
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def record(self, name, start, **args):
+        """Records a phase that started at start (see Tracer.start) and ends now"""
+        if self.enabled:
+            end = time.perf_counter_ns()
+            self.events.append((name, start, end - start, threading.get_ident(), args))
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def durations(self, name):
+        """List of durations in seconds of all phases called name"""
+        return [e[2] / 1e9 for e in self.events if e[0] == name]
+
+    def summary(self):
+        """
+        Totals per phase and counters
+
+            Returns:
+                summary (dict):     {"phases": {name: {count, total_ms, mean_ms, max_ms}}, "counters": {...}}
+        """
+        phases = {}
+        for name, start, duration, tid, args in self.events:
+            p = phases.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            p["count"] += 1
+            p["total_ms"] += duration / 1e6
+            p["max_ms"] = max(p["max_ms"], duration / 1e6)
+        for p in phases.values():
+            p["mean_ms"] = p["total_ms"] / p["count"]
+        return {"phases": phases, "counters": dict(self.counters)}
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"{'phase':<28}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}")
+        for name, p in sorted(summary["phases"].items(), key=lambda x: -x[1]["total_ms"]):
+            print(f"{name:<28}{p['count']:>8}{p['total_ms']:>12.1f}{p['mean_ms']:>10.3f}{p['max_ms']:>10.3f}")
+        for name, n in summary["counters"].items():
+            print(f"{name:<28}{n:>8}")
+
+    def save_json(self, filename):
+        """Saves summary, counters and every phase (start and duration in ms since the tracer was created)"""
+        events = [{"name": name, "start_ms": (start - self._origin) / 1e6, "duration_ms": duration / 1e6,
+                   "args": args} for name, start, duration, tid, args in self.events]
+        with open(filename, "w") as x:
+            json.dump({**self.summary(), "events": events}, x, indent=1, default=str)
+
+    def save_chrome_trace(self, filename):
+        """Saves the phases in Chrome trace format, open with chrome://tracing or https://ui.perfetto.dev"""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (start - self._origin) / 1e3, "dur": duration / 1e3,
+                   "pid": pid, "tid": tid, "args": args} for name, start, duration, tid, args in self.events]
+        end = (time.perf_counter_ns() - self._origin) / 1e3
+        events += [{"name": name, "ph": "C", "ts": end, "pid": pid, "args": {name: n}}
+                   for name, n in self.counters.items()]
+        with open(filename, "w") as x:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, x, default=str)
+
+    def save(self, filename):
+        """Saves a Chrome trace if filename ends with .trace.json, otherwise the json of save_json"""
+        if filename.endswith(".trace.json"):
+            self.save_chrome_trace(filename)
+        else:
+            self.save_json(filename)
+
+
+# shared by everything that is called without tracer
+NULL_TRACER = Tracer(enabled=False)
@@ -0,0 +1,230 @@
+import csv
+import os
+import pickle
+import struct
+
+import numpy as np
+import Wordle_functions as wrdl
+import Wordle_algo as algo
+
+from concurrent.futures import ProcessPoolExecutor
+
+TREE_FILE = "strategy_tree.bin"
+TREE_VERSION = 1
+_TREE_MAGIC = b"WRDLTREE"
+_TREE_HEADER = struct.Struct("<8sHHI")  # magic, version, word length, number of words
+_NODE = struct.Struct("<IH")  # guess (index in word list), number of children
+_CHILD = struct.Struct("<HI")  # reply code, offset of the child node
+
+
+def _compile_node(allowed_words, reduced_list, freq_map, custom_score, turn, pattern_matrix=None, weight_model=None,
+                  entropy_db=None, model=None, executor=None):
+    """
+    Runs the wordle_algorithm_4 policy for one state and recursively for every reply
+
+        Returns:
+            node (tuple):   (guess, {reply code: child node})
+    """
+    if len(reduced_list) == 1:
+        return reduced_list[0], {}
+
+    inf = weight_model.entropy(reduced_list)
+    if entropy_db is None:
+        # only the best guess is needed, see algo.best_guesses
+        guess = algo.best_guesses(allowed_words, reduced_list, freq_map, inf, turn, custom_score, k=1,
+                                  pattern_matrix=pattern_matrix, weight_model=weight_model)[0][-1]
+    else:
+        cur_hash = wrdl.state_hash(reduced_list, model)
+        entropies_list_all = entropy_db.get(cur_hash)
+        if entropies_list_all is None:
+            entropies_list_all = algo.entropies_for_state(allowed_words, reduced_list, freq_map,
+                                                          pattern_matrix=pattern_matrix, weight_model=weight_model)
+            entropy_db[cur_hash] = entropies_list_all
+        guess = algo.score_guesses(entropies_list_all, inf, turn, custom_score, k=1)[0][-1]
+
+    # every remaining possible solution gives exactly one reply
+    if pattern_matrix is not None:
+        codes = pattern_matrix.row(guess, reduced_list)
+    else:
+        codes = wrdl.wordle_reply_batch(reduced_list, guess)
+    solved = 3 ** len(guess) - 1
+    branches = {}
+    for word, code in zip(reduced_list, codes.tolist()):
+        if code != solved:
+            branches.setdefault(code, []).append(word)
+
+    args = [(allowed_words, branches[code], freq_map, custom_score, turn + 1, pattern_matrix, weight_model)
+            for code in branches]
+    if executor is not None:
+        # subtrees are compiled in other processes, entropy_db stays in this one
+        children = list(executor.map(_compile_branch, args))
+    else:
+        children = [_compile_node(*a, entropy_db=entropy_db, model=model) for a in args]
+    return guess, dict(zip(branches, children))
+
+
+def _compile_branch(args):
+    return _compile_node(*args)
+
+
+def compile_tree(allowed_words, freq_map, custom_score=(0, 0, 0), pattern_matrix=None, entropy_db=None,
+                 executor=None):
+    """
+    Runs the wordle_algorithm_4 policy for every reachable reply from the opening guess and
+    returns the resulting decision tree
+
+        Args:
+            allowed_words (list):   List of strings with allowed words
+            freq_map(dict):         Dictionary of words (key) and frequency (value). Does not need to be standardized
+            custom_score():         tuple of 3 parameters from np.polyfit to calculate expected number of guesses
+            pattern_matrix(PatternMatrix): Precomputed replies (see wrdl.load_pattern_matrix). Optional
+            entropy_db(dict):       Dictionary of hashes (see wrdl.state_hash) with entropy list. Optional,
+                                    only used for the states calculated by this process. Without it only
+                                    the guesses that can be the best one are evaluated (algo.best_guesses)
+            executor(Executor):     concurrent.futures executor. Optional, subtrees after the opening guess
+                                    are compiled in parallel
+
+        Returns:
+            tree (tuple):           Root node (guess, {reply code: child node})
+    """
+    allowed_words = sorted(allowed_words)
+    model = wrdl.model_hash(freq_map, allowed_words) if entropy_db is not None else None
+    weight_model = wrdl.WeightModel(allowed_words, freq_map)
+    return _compile_node(allowed_words, allowed_words, freq_map, custom_score, 1, pattern_matrix, weight_model,
+                         entropy_db, model, executor=executor)
+
+
+def save_tree(tree, words, filename=TREE_FILE):
+    """
+    Saves a tree from compile_tree in a compact binary format: word list, then one record per node
+    with the index of the guess and (reply code, offset) of every child. Nodes are stored
+    breadth first, the root is at offset 0
+
+        Args:
+            tree (tuple):       Root node from compile_tree
+            words (list):       List of strings with allowed words
+            filename (str):     Path of the file
+    """
+    words = sorted(words)
+    index = {w: i for i, w in enumerate(words)}
+    length = len(words[0])
+
+    # breadth first, offset of every node is known before it is written
+    nodes = [tree]
+    offsets = [0]
+    position = 0
+    for node in nodes:
+        offsets.append(position)
+        position += _NODE.size + _CHILD.size * len(node[1])
+        nodes.extend(node[1][code] for code in sorted(node[1]))
+    offsets = offsets[1:]
+
+    data = bytearray()
+    child_number = 1
+    for node in nodes:
+        guess, children = node
+        data += _NODE.pack(index[guess], len(children))
+        for code in sorted(children):
+            data += _CHILD.pack(code, offsets[child_number])
+            child_number += 1
+
+    with open(filename, "wb") as x:
+        x.write(_TREE_HEADER.pack(_TREE_MAGIC, TREE_VERSION, length, len(words)))
+        x.write("".join(words).encode("ascii"))
+        x.write(data)
+
+
+class StrategyTree:
+    """
+    Compiled strategy from save_tree. Looks up the next guess from a guess/reply history
+    without any calculation, entropy_db or filter_words
+
+        Args:
+            filename (str):     Path of the file
+    """
+
+    def __init__(self, filename=TREE_FILE):
+        with open(filename, "rb") as x:
+            data = x.read()
+        magic, version, length, n_words = _TREE_HEADER.unpack_from(data)
+        if magic != _TREE_MAGIC:
+            raise Exception(f"{filename} is not a strategy tree")
+        if version != TREE_VERSION:
+            raise Exception(f"{filename} has version {version}, expected {TREE_VERSION}. Please compile it again")
+        words = data[_TREE_HEADER.size:_TREE_HEADER.size + length * n_words].decode("ascii")
+        self.words = [words[i:i + length] for i in range(0, len(words), length)]
+        self.length = length
+        self._nodes = memoryview(data)[_TREE_HEADER.size + length * n_words:]
+
+    def guess(self, node=0):
+        """Guess of the node at offset node"""
+        return self.words[_NODE.unpack_from(self._nodes, node)[0]]
+
+    def child(self, node, reply):
+        """
+        Offset of the node after receiving reply in node. None if the reply means solved
+
+            Args:
+                node (int):     Offset of the node, 0 for the root
+                reply (list):   List of int, e.g. [1, 2, 0, 2, 2] = 🟨🟩⬜🟩🟩, or reply code
+
+            Returns:
+                node (int):     Offset of the next node
+        """
+        code = reply if isinstance(reply, (int, np.integer)) else wrdl.reply_to_code(reply)
+        if code == 3 ** self.length - 1:
+            return None
+        _, n = _NODE.unpack_from(self._nodes, node)
+        # children are sorted by reply code
+        low, high = 0, n
+        while low < high:
+            middle = (low + high) // 2
+            child_code, offset = _CHILD.unpack_from(self._nodes, node + _NODE.size + _CHILD.size * middle)
+            if child_code == code:
+                return offset
+            if child_code < code:
+                low = middle + 1
+            else:
+                high = middle
+        raise Exception(f"reply {wrdl.wordle_print(wrdl.code_to_reply(code, self.length))} is not possible "
+                        f"for {self.guess(node)}")
+
+    def next_guess(self, history=()):
+        """
+        Next guess of the strategy
+
+            Args:
+                history (list):     List of tuples (guess, reply) played so far
+
+            Returns:
+                guess (str):        Next guess, None if the last reply solved the game
+        """
+        node = 0
+        for guess, reply in history:
+            if guess != self.guess(node):
+                raise Exception(f"{guess} is not part of the strategy, expected {self.guess(node)}")
+            node = self.child(node, reply)
+            if node is None:
+                return None
+        return self.guess(node)
+
+
+if __name__ == '__main__':
+    # Importing solutions and allowed words to lists
+    csv_reader = csv.reader(open('solutions.csv', 'r'))
+    solutions = list(csv_reader)[0]  # contains all possible solutions
+    csv_reader = csv.reader(open('allowed_words.csv', 'r'))
+    allowed_words = list(csv_reader)[0]  # contains allowed words beside solutions
+    all_allowed = allowed_words + solutions
+
+    with open("all_allowed_freq_sigmoid.pkl", 'rb') as x:
+        all_allowed_freq_sigmoid = pickle.load(x)
+
+    pattern_matrix = wrdl.load_pattern_matrix() if os.path.exists(wrdl.PATTERN_MATRIX_FILE) else None
+    custom_score = (-0.012405539570697632, 0.3642899622411526, 1.1890485932345454)
+
+    with ProcessPoolExecutor() as executor:
+        tree = compile_tree(all_allowed, all_allowed_freq_sigmoid, custom_score, pattern_matrix=pattern_matrix,
+                            executor=executor)
+    save_tree(tree, all_allowed)
+    print(f"Strategy tree saved to {TREE_FILE}, opening guess {tree[0]}")